@@ -1,93 +1,479 @@
 import random
+import time
+from Engine import BatchEvaluation
+from Engine import MoveOrdering
+from Engine import OpeningBook
+from Engine import SearchStatistics
+from Engine import TranspositionTable
+from Engine.Evaluation import piece_score, piece_position_scores
 
-
-piece_score = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "p": 1}
-
-knight_scores = [[0.0, 0.1, 0.2, 0.2, 0.2, 0.2, 0.1, 0.0],
-                 [0.1, 0.3, 0.5, 0.5, 0.5, 0.5, 0.3, 0.1],
-                 [0.2, 0.5, 0.6, 0.65, 0.65, 0.6, 0.5, 0.2],
-                 [0.2, 0.55, 0.65, 0.7, 0.7, 0.65, 0.55, 0.2],
-                 [0.2, 0.5, 0.65, 0.7, 0.7, 0.65, 0.5, 0.2],
-                 [0.2, 0.55, 0.6, 0.65, 0.65, 0.6, 0.55, 0.2],
-                 [0.1, 0.3, 0.5, 0.55, 0.55, 0.5, 0.3, 0.1],
-                 [0.0, 0.1, 0.2, 0.2, 0.2, 0.2, 0.1, 0.0]]
-
-bishop_scores = [[0.0, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.0],
-                 [0.2, 0.4, 0.4, 0.4, 0.4, 0.4, 0.4, 0.2],
-                 [0.2, 0.4, 0.5, 0.6, 0.6, 0.5, 0.4, 0.2],
-                 [0.2, 0.5, 0.5, 0.6, 0.6, 0.5, 0.5, 0.2],
-                 [0.2, 0.4, 0.6, 0.6, 0.6, 0.6, 0.4, 0.2],
-                 [0.2, 0.6, 0.6, 0.6, 0.6, 0.6, 0.6, 0.2],
-                 [0.2, 0.5, 0.4, 0.4, 0.4, 0.4, 0.5, 0.2],
-                 [0.0, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.0]]
-
-rook_scores = [[0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25],
-               [0.5, 0.75, 0.75, 0.75, 0.75, 0.75, 0.75, 0.5],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.25, 0.25, 0.25, 0.5, 0.5, 0.25, 0.25, 0.25]]
-
-queen_scores = [[0.0, 0.2, 0.2, 0.3, 0.3, 0.2, 0.2, 0.0],
-                [0.2, 0.4, 0.4, 0.4, 0.4, 0.4, 0.4, 0.2],
-                [0.2, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.2],
-                [0.3, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.3],
-                [0.4, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.3],
-                [0.2, 0.5, 0.5, 0.5, 0.5, 0.5, 0.4, 0.2],
-                [0.2, 0.4, 0.5, 0.4, 0.4, 0.4, 0.4, 0.2],
-                [0.0, 0.2, 0.2, 0.3, 0.3, 0.2, 0.2, 0.0]]
-
-pawn_scores = [[0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8],
-               [0.7, 0.7, 0.7, 0.7, 0.7, 0.7, 0.7, 0.7],
-               [0.3, 0.3, 0.4, 0.5, 0.5, 0.4, 0.3, 0.3],
-               [0.25, 0.25, 0.3, 0.45, 0.45, 0.3, 0.25, 0.25],
-               [0.2, 0.2, 0.2, 0.4, 0.4, 0.2, 0.2, 0.2],
-               [0.25, 0.15, 0.1, 0.2, 0.2, 0.1, 0.15, 0.25],
-               [0.25, 0.3, 0.3, 0.0, 0.0, 0.3, 0.3, 0.25],
-               [0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2]]
-
-piece_position_scores = {"wN": knight_scores,
-                         "bN": knight_scores[::-1],
-                         "wB": bishop_scores,
-                         "bB": bishop_scores[::-1],
-                         "wQ": queen_scores,
-                         "bQ": queen_scores[::-1],
-                         "wR": rook_scores,
-                         "bR": rook_scores[::-1],
-                         "wp": pawn_scores,
-                         "bp": pawn_scores[::-1]}
-
-CHECKMATE = 1000
+CHECKMATE = 1000  # score of mating at the root; a mate found ply plies from the root scores CHECKMATE - ply
+MATE_THRESHOLD = CHECKMATE // 2  # scores at least this far from 0 are mates, no evaluation comes close
 STALEMATE = 0
-DEPTH = 3
+MAX_DEPTH = 32
+MOVE_TIME = 2.0  # default seconds per move
+MOVES_TO_GO = 30  # moves the remaining clock is expected to last for
+TIME_MARGIN = 0.05  # seconds kept in reserve for overhead when playing on a clock
+TIME_CHECK_INTERVAL = 128  # nodes between looks at the clock and the stop event
+HASH_SIZE_MB = 16
+DEBUG_EVALUATION = False  # cross-check every incremental evaluation against a full scoreBoard scan
+DELTA_MARGIN = 2  # a capture that can't raise the score to within this of alpha is skipped in quiescence search
+BATCH_LEAVES = False  # evaluate the children of depth 1 nodes in one numpy batch, as their quiescence stand-pat scores
+NULL_MOVE_PRUNING = True  # cut a node off when passing the turn still fails high in a reduced search
+NULL_MOVE_REDUCTION = 2  # extra depth taken off the null-move search, one more from depth NULL_MOVE_DEEP_DEPTH
+NULL_MOVE_DEEP_DEPTH = 7
+NULL_MOVE_MIN_DEPTH = 3
+LATE_MOVE_REDUCTIONS = True  # search quiet moves late in the ordering one ply shallower unless they beat alpha
+LMR_FULL_DEPTH_MOVES = 3  # moves searched at full depth before reductions start
+LMR_MIN_DEPTH = 3
+LMR_DEEP_MOVES = 8  # from this move on, and at depth LMR_DEEP_DEPTH or more, the reduction is two plies
+LMR_DEEP_DEPTH = 6
+NULL_WINDOW = 0.01  # one centipawn, the smallest difference between two scores
+PRINCIPAL_VARIATION_SEARCH = True  # search moves after the first with a null window, and fully only if they beat alpha
+ASPIRATION_WINDOW = 0.5  # pawns either side of the previous iteration's score the root is first searched with
+ASPIRATION_MIN_DEPTH = 4  # shallower iterations, whose scores swing more, search the full window
+
+transposition_table = TranspositionTable.TranspositionTable(HASH_SIZE_MB)
+move_orderer = MoveOrdering.MoveOrderer()
+nodes_searched = 0  # main search nodes
+quiescence_nodes = 0
+beta_cutoffs = 0  # main search nodes that failed high
+first_move_cutoffs = 0  # of those, the ones where the first move searched was enough
+null_move_cutoffs = 0
+late_move_reductions = 0  # reduced searches of late quiet moves
+late_move_researches = 0  # of those, the ones that beat alpha and were searched again at full depth
+pv_researches = 0  # null-window searches that landed inside the window and were searched again with it
+aspiration_researches = 0  # root searches repeated with a wider window after failing low or high
+legal_generations = 0  # full legal move generations during the last search
+root_ply = 0  # length of the move log at the root of the current search
+deadline = None  # time.perf_counter() value at which the current iteration is abandoned
+node_limit = None  # main and quiescence nodes after which the current iteration is abandoned
+stop_event = None  # Event-like object (is_set()) another process can set to stop the search, see EngineWorker
+depth_reached = 0
+best_score = 0
+pv_table = [[] for _ in range(MAX_DEPTH + 1)]  # pv_table[ply]: best line found from the node at ply, by ply
+best_line = []  # principal variation (Moves) of the last completed iteration, or the book move
+line_hint = []  # move ids expected from the root on, from the previous search's line, see lineHint
+previous_line = None  # (root ply, root key, move ids) of the last search's best line
+opening_book = None  # OpeningBook consulted before searching, see setOpeningBook
+book_move_played = False  # whether the last findBestMove move came from the opening book
+
+
+def setHashSize(size_mb):
+    global transposition_table
+    transposition_table = TranspositionTable.TranspositionTable(size_mb)
+
+
+def setOpeningBook(path):
+    """
+    Plays moves from the Polyglot book at path while the game is in it; None turns the book off.
+    """
+    global opening_book
+    if opening_book is not None:
+        opening_book.close()
+    opening_book = OpeningBook.OpeningBook(path) if path is not None else None
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def mateDistance(score):
+    """
+    Moves to mate for a search score, negative when the side to move is the one mated, or None for any other score.
+    """
+    if abs(score) < MATE_THRESHOLD:
+        return None
+    moves = (int(round(CHECKMATE - abs(score))) + 1) // 2
+    return moves if score > 0 else -moves
+
+
+def scoreToTable(score, ply):
+    """
+    A mate score is stored as the distance to mate from the node rather than from the root, so that it holds in
+    whichever position, at whatever ply, the transposition table hands it out again.
+    """
+    if score >= MATE_THRESHOLD:
+        return score + ply
+    if score <= -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+
+def scoreFromTable(score, ply):
+    if score >= MATE_THRESHOLD:
+        return score - ply
+    if score <= -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+
+def searchStopped():
+    """
+    Whether the current iteration must be abandoned: the deadline has passed, the node limit is used up or a stop
+    was requested.
+    """
+    if deadline is not None and time.perf_counter() >= deadline:
+        return True
+    # the first iteration always completes so that there is a move to play
+    if node_limit is not None and depth_reached > 0 and nodes_searched + quiescence_nodes >= node_limit:
+        return True
+    return stop_event is not None and depth_reached > 0 and stop_event.is_set()
+
+
+def allocateTime(time_left, increment=0.0):
+    """
+    Seconds to spend on a move given the remaining clock time and the increment per move.
+    """
+    budget = time_left / MOVES_TO_GO + increment * 0.75
+    return max(0.01, min(budget, time_left - TIME_MARGIN))
+
+
+def lineHint(gs):
+    """
+    The rest of the previous search's best line, as move ids, when the game has followed it to gs, or [] when the
+    game went another way. It orders the moves of positions the transposition table no longer has a move for.
+    """
+    if previous_line is None:
+        return []
+    ply, key, move_ids = previous_line
+    played = len(gs.moveLog) - ply
+    if played < 0 or played >= len(move_ids) or gs.zobristKeyLog[ply] != key:
+        return []
+    for move, move_id in zip(gs.moveLog[ply:], move_ids):
+        if move is None or move.moveID != move_id:
+            return []
+    return move_ids[played:]
+
+
+def findBestMove(gs, valid_moves, return_queue=None, max_depth=MAX_DEPTH, move_time=MOVE_TIME, time_left=None,
+                 increment=0.0, info_callback=None, max_nodes=None, depth_offset=0):
+    """
+    Iterative deepening: searches depth 1, 2, 3... until max_depth is reached or the time budget runs out, and
+    returns (and puts on return_queue, if given) the best move of the last completed iteration.
+    The budget is move_time seconds, or a share of time_left and increment when playing on a clock;
+    with neither the search runs to max_depth. max_nodes limits the main and quiescence nodes instead of, or as well
+    as, the time.
+    depth_offset makes every iteration that many plies deeper, from depth_offset + 1 to max_depth + depth_offset; Lazy
+    SMP helpers search with it so that they don't all search the same depths as the main worker.
+    A move found in the opening book is returned straight away without searching.
+    info_callback, if given, is called with searchInfo after every completed iteration.
+    The whole expected line of play, starting with the returned move, is left in best_line.
+    """
+    global next_move, nodes_searched, quiescence_nodes, beta_cutoffs, first_move_cutoffs, null_move_cutoffs, \
+        late_move_reductions, late_move_researches, pv_researches, aspiration_researches, legal_generations, root_ply, \
+        deadline, node_limit, depth_reached, best_score, book_move_played, best_line, line_hint, previous_line
+    start_time = time.perf_counter()
+    start_generations = gs.legalGenerations
+    if time_left is not None:
+        move_time = allocateTime(time_left, increment)
+    nodes_searched = 0
+    quiescence_nodes = 0
+    beta_cutoffs = 0
+    first_move_cutoffs = 0
+    null_move_cutoffs = 0
+    late_move_reductions = 0
+    late_move_researches = 0
+    pv_researches = 0
+    aspiration_researches = 0
+    legal_generations = 0
+    root_ply = len(gs.moveLog)
+    depth_reached = 0
+    best_score = 0
+    node_limit = max_nodes
+    book_move_played = False
+    best_line = []
+    if opening_book is not None and valid_moves:
+        book_move = opening_book.findMove(gs, valid_moves)
+        if book_move is not None:
+            book_move_played = True
+            best_line = [book_move]
+            if return_queue is not None:
+                return_queue.put(book_move)
+            return book_move
+    transposition_table.resetStats()
+    move_orderer.newSearch()
+    random.shuffle(valid_moves)  # varies the choice between equally ordered moves
+    line_hint = lineHint(gs)
+    best_move = None
+    last_depth = min(max_depth + depth_offset, MAX_DEPTH)  # pv_table has room for MAX_DEPTH plies
+    for depth in range(1 + depth_offset, last_depth + 1):
+        # the first iteration always completes so that there is a move to play
+        deadline = start_time + move_time if move_time is not None and depth_reached > 0 else None
+        next_move = None
+        try:
+            score = aspirationSearch(gs, valid_moves, depth)
+        except SearchTimeout:
+            while len(gs.moveLog) > root_ply:
+                if gs.moveLog[-1] is None:
+                    gs.undoNullMove()
+                else:
+                    gs.undoMove()
+            break
+        best_move = next_move
+        best_score = score
+        depth_reached = depth
+        # the root's line is empty when every move lost to the same mate, or when there was no move at all
+        best_line = pv_table[0] or ([best_move] if best_move is not None else [])
+        if info_callback is not None:
+            info_callback(searchInfo(gs, start_time))
+        if abs(score) >= MATE_THRESHOLD or (stop_event is not None and stop_event.is_set()):
+            break
+        # an iteration takes several times longer than the previous one, don't start one that can't finish
+        if move_time is not None and time.perf_counter() - start_time > move_time / 2:
+            break
+        if max_nodes is not None and nodes_searched + quiescence_nodes >= max_nodes:
+            break
+    deadline = None
+    node_limit = None
+    legal_generations = gs.legalGenerations - start_generations
+    line_hint = []
+    previous_line = (root_ply, gs.zobristKey, [move.moveID for move in best_line if move is not None])
+    if return_queue is not None:
+        return_queue.put(best_move)
+    return best_move
+
+
+def aspirationSearch(gs, valid_moves, depth):
+    """
+    Searches the root to depth inside a window around the previous iteration's score, which cuts off more than the
+    full window does. A score on or outside the window is only a bound, so the search is then repeated with the
+    window widened on that side until the score lands inside it.
+    """
+    global aspiration_researches
+    turn_multiplier = 1 if gs.whiteToMove else -1
+    window = ASPIRATION_WINDOW
+    if window is None or depth < ASPIRATION_MIN_DEPTH or abs(best_score) >= MATE_THRESHOLD:
+        # the best move of the previous iteration is in the transposition table, so it is searched first
+        return findMoveNegaMaxAlphaBeta(gs, valid_moves, depth, -CHECKMATE, CHECKMATE, turn_multiplier)
+    alpha = max(-CHECKMATE, best_score - window)
+    beta = min(CHECKMATE, best_score + window)
+    while True:
+        score = findMoveNegaMaxAlphaBeta(gs, valid_moves, depth, alpha, beta, turn_multiplier)
+        if score <= alpha and alpha > -CHECKMATE:
+            alpha = max(-CHECKMATE, alpha - window)
+        elif score >= beta and beta < CHECKMATE:
+            beta = min(CHECKMATE, beta + window)
+        else:
+            return score
+        aspiration_researches += 1
+        window *= 2
 
 
-def findBestMove(gs, valid_moves, return_queue):
-    global next_move
-    next_move = None
-    random.shuffle(valid_moves)
-    findMoveNegaMaxAlphaBeta(gs, valid_moves, DEPTH, -CHECKMATE, CHECKMATE,
-                             1 if gs.whiteToMove else -1)
-    return_queue.put(next_move)
+def search(gs, valid_moves, profile=False, **limits):
+    """
+    findBestMove returning (move, SearchStatistics). limits are findBestMove keyword arguments. With profile the
+    search is sampled by a SearchStatistics.SamplingProfiler, which fills in the time spent in each phase.
+    """
+    profiler = SearchStatistics.SamplingProfiler() if profile else None
+    if profiler is not None:
+        profiler.start()
+    start_time = time.perf_counter()
+    try:
+        move = findBestMove(gs, valid_moves, **limits)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+    statistics = SearchStatistics.SearchStatistics()
+    statistics.time = time.perf_counter() - start_time
+    statistics.depth = depth_reached
+    statistics.score = best_score
+    statistics.nodes = nodes_searched
+    statistics.qnodes = quiescence_nodes
+    statistics.betaCutoffs = beta_cutoffs
+    statistics.firstMoveCutoffs = first_move_cutoffs
+    statistics.nullMoveCutoffs = null_move_cutoffs
+    statistics.lateMoveReductions = late_move_reductions
+    statistics.lateMoveResearches = late_move_researches
+    statistics.pvResearches = pv_researches
+    statistics.aspirationResearches = aspiration_researches
+    statistics.pv = [move.getUciNotation() for move in best_line if move is not None]
+    statistics.ttHits = transposition_table.hits
+    statistics.ttProbes = transposition_table.hits + transposition_table.misses
+    statistics.legalGenerations = legal_generations
+    if profiler is not None:
+        profiler.fill(statistics)
+    return move, statistics
+
+
+def searchInfo(gs, start_time):
+    """
+    A summary of the search so far: depth, score (pawns, for the side to move), nodes, qnodes, time in seconds,
+    hashfull in permille, whether the move came from the book, and the principal variation as UCI move strings.
+    """
+    return {'depth': depth_reached, 'score': best_score, 'nodes': nodes_searched, 'qnodes': quiescence_nodes,
+            'time': time.perf_counter() - start_time, 'hashfull': transposition_table.hashfull(),
+            'book': book_move_played, 'pv': [move.getUciNotation() for move in best_line if move is not None]}
 
 
 def findMoveNegaMaxAlphaBeta(gs, valid_moves, depth, alpha, beta, turn_multiplier):
-    global next_move
+    """
+    valid_moves may be None, in which case they are only generated if the transposition table
+    does not already settle the position.
+    A node whose window is wider than NULL_WINDOW is on the principal variation: it leaves its best line in
+    pv_table[ply] and is always searched, never settled by the transposition table, so that the line is complete.
+    """
+    global next_move, nodes_searched, beta_cutoffs, first_move_cutoffs, null_move_cutoffs, late_move_reductions, \
+        late_move_researches, pv_researches
+    ply = len(gs.moveLog) - root_ply
+    pv_table[ply] = []
     if depth == 0:
-        return turn_multiplier * scoreBoard(gs)
-    # move ordering - implement later //TODO
+        return quiescenceSearch(gs, alpha, beta, turn_multiplier)
+    nodes_searched += 1
+    if nodes_searched % TIME_CHECK_INTERVAL == 0 and searchStopped():
+        raise SearchTimeout()
+    alpha_original = alpha
+    pv_node = beta - alpha > 1.5 * NULL_WINDOW  # the scores are floats, a null window isn't exactly NULL_WINDOW wide
+    tt_move_id = TranspositionTable.NO_MOVE
+    entry = transposition_table.probe(gs.zobristKey)
+    if entry is not None:
+        tt_depth, tt_flag, tt_score, tt_move_id = entry
+        tt_score = scoreFromTable(tt_score, ply)
+        if tt_depth >= depth and ply > 0 and not pv_node:  # the root always searches so that next_move is set
+            if tt_flag == TranspositionTable.EXACT:
+                return tt_score
+            elif tt_flag == TranspositionTable.LOWERBOUND:
+                alpha = max(alpha, tt_score)
+            else:
+                beta = min(beta, tt_score)
+            if alpha >= beta:
+                return tt_score
+    if tt_move_id == TranspositionTable.NO_MOVE and ply < len(line_hint) and followsHint(gs, ply):
+        tt_move_id = line_hint[ply]
+    in_check = gs.inCheck()
+    # null move: if the opponent, given a free move, still can't bring the score below beta, a real move won't either
+    if NULL_MOVE_PRUNING and ply > 0 and not pv_node and depth >= NULL_MOVE_MIN_DEPTH and not in_check and \
+            gs.moveLog[-1] is not None and abs(beta) < MATE_THRESHOLD and gs.hasNonPawnMaterial():
+        reduction = NULL_MOVE_REDUCTION + (1 if depth >= NULL_MOVE_DEEP_DEPTH else 0)
+        gs.makeNullMove()
+        score = -findMoveNegaMaxAlphaBeta(gs, None, max(0, depth - 1 - reduction), -beta, -beta + NULL_WINDOW,
+                                          -turn_multiplier)
+        gs.undoNullMove()
+        if score >= beta:
+            null_move_cutoffs += 1
+            return beta if score >= MATE_THRESHOLD else score  # a mate after passing proves no mate
+    batch_leaves = depth == 1 and BATCH_LEAVES
+    if valid_moves is None and not batch_leaves:
+        # generated stage by stage, so a cutoff saves generating the remaining moves
+        moves = move_orderer.stagedMoves(gs, ply, tt_move_id)
+    else:
+        if valid_moves is None:
+            valid_moves = gs.getValidMoves()
+        move_orderer.orderMoves(valid_moves, ply, tt_move_id, gs.whiteToMove)
+        moves = valid_moves
+    leaf_scores = batchLeafScores(gs, moves, turn_multiplier) if batch_leaves and moves else None
     max_score = -CHECKMATE
-    for move in valid_moves:
-        gs.makeMove(move)
-        next_moves = gs.getValidMoves()
-        score = -findMoveNegaMaxAlphaBeta(gs, next_moves, depth - 1, -beta, -alpha, -turn_multiplier)
-        if score > max_score:
+    best_move = None
+    move_number = -1
+    for move_number, move in enumerate(moves):
+        if leaf_scores is not None:
+            gs.makeMove(move)
+            score = -quiescenceSearch(gs, -beta, -alpha, -turn_multiplier, -leaf_scores[move_number])
+            gs.undoMove()
+        else:
+            gs.makeMove(move)
+            # late move reductions: a quiet move this far down the ordering rarely beats alpha, so a shallower
+            # null-window search tries to show that, and the move is searched properly only if it fails
+            reduction = 0
+            if LATE_MOVE_REDUCTIONS and move_number >= LMR_FULL_DEPTH_MOVES and depth >= LMR_MIN_DEPTH and \
+                    not in_check and not move.is_capture and not move.isPawnPromotion and not gs.inCheck():
+                reduction = 2 if move_number >= LMR_DEEP_MOVES and depth >= LMR_DEEP_DEPTH else 1
+                late_move_reductions += 1
+            full_window = move_number == 0 or not (PRINCIPAL_VARIATION_SEARCH or reduction)
+            if not full_window:
+                # principal variation search: the first move is expected to be the best, a null window around
+                # alpha is enough to confirm that this one isn't, and cuts off far more than the full window
+                score = -findMoveNegaMaxAlphaBeta(gs, None, depth - 1 - reduction, -alpha - NULL_WINDOW, -alpha,
+                                                  -turn_multiplier)
+                if score > alpha and reduction:
+                    late_move_researches += 1
+                    if PRINCIPAL_VARIATION_SEARCH:
+                        score = -findMoveNegaMaxAlphaBeta(gs, None, depth - 1, -alpha - NULL_WINDOW, -alpha,
+                                                          -turn_multiplier)
+                    else:
+                        full_window = True
+                if PRINCIPAL_VARIATION_SEARCH and alpha < score < beta:
+                    pv_researches += 1
+                    full_window = True
+            if full_window:
+                score = -findMoveNegaMaxAlphaBeta(gs, None, depth - 1, -beta, -alpha, -turn_multiplier)
+            gs.undoMove()
+        if score > max_score or best_move is None:  # a lost position still has a move to play
             max_score = score
-            if depth == DEPTH:
+            best_move = move
+            if ply == 0:
                 next_move = move
+        if max_score > alpha:
+            alpha = max_score
+            pv_table[ply] = [move] + (pv_table[ply + 1] if leaf_scores is None else [])
+        if alpha >= beta:
+            beta_cutoffs += 1
+            if move_number == 0:
+                first_move_cutoffs += 1
+            move_orderer.recordCutoff(move, ply, depth, gs.whiteToMove)
+            break
+    if move_number < 0:
+        return -CHECKMATE + ply if gs.checkmate else STALEMATE
+    if max_score <= alpha_original:
+        flag = TranspositionTable.UPPERBOUND
+    elif max_score >= beta:
+        flag = TranspositionTable.LOWERBOUND
+    else:
+        flag = TranspositionTable.EXACT
+    transposition_table.store(gs.zobristKey, depth, flag, scoreToTable(max_score, ply),
+                              best_move.moveID if best_move is not None else TranspositionTable.NO_MOVE)
+    return max_score
+
+
+def followsHint(gs, ply):
+    """
+    Whether the moves from the root to gs, ply of them, are the first moves of line_hint.
+    """
+    for move, move_id in zip(gs.moveLog[root_ply:], line_hint[:ply]):
+        if move is None or move.moveID != move_id:
+            return False
+    return True
+
+
+def quiescenceSearch(gs, alpha, beta, turn_multiplier, stand_pat=None):
+    """
+    Searches captures and promotions only, until the position is quiet, so that leaf scores don't stop in the
+    middle of an exchange. The side to move may always stand pat on the static score, except when in check,
+    where every evasion is searched. stand_pat is the static score if it has been evaluated already.
+    """
+    global quiescence_nodes
+    quiescence_nodes += 1
+    if quiescence_nodes % TIME_CHECK_INTERVAL == 0 and searchStopped():
+        raise SearchTimeout()
+    moves = gs.getCaptureMoves()
+    in_check = gs.in_check
+    if in_check:
+        if len(moves) == 0:
+            return -CHECKMATE + len(gs.moveLog) - root_ply
+        max_score = -CHECKMATE
+    else:
+        if len(moves) == 0 and not gs.hasLegalMove():
+            return STALEMATE
+        if stand_pat is None:
+            stand_pat = turn_multiplier * evaluateBoard(gs)
+        if stand_pat >= beta:
+            return stand_pat
+        # delta pruning: even winning a queen wouldn't get back to alpha
+        if stand_pat + piece_score['Q'] + DELTA_MARGIN < alpha:
+            return stand_pat
+        max_score = stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+    move_orderer.orderMoves(moves, len(gs.moveLog) - root_ply, TranspositionTable.NO_MOVE, gs.whiteToMove)
+    for move in moves:
+        if not in_check and not move.isPawnPromotion and \
+                stand_pat + piece_score[move.pieceCaptured[1]] + DELTA_MARGIN < alpha:
+            continue  # delta pruning: this capture can't raise the score to alpha
+        gs.makeMove(move)
+        score = -quiescenceSearch(gs, -beta, -alpha, -turn_multiplier)
         gs.undoMove()
+        if score > max_score:
+            max_score = score
         if max_score > alpha:
             alpha = max_score
         if alpha >= beta:
@@ -95,6 +481,37 @@ def findMoveNegaMaxAlphaBeta(gs, valid_moves, depth, alpha, beta, turn_multiplie
     return max_score
 
 
+def batchLeafScores(gs, moves, turn_multiplier):
+    """
+    Static scores of the positions after each of moves, from the point of view of the side to move, evaluated in a
+    single numpy call. They are the stand-pat scores of the children's quiescence searches, which still look at
+    captures, checkmate and stalemate.
+    """
+    positions = []
+    for move in moves:
+        gs.makeMove(move)
+        positions.append(BatchEvaluation.positionArray(gs))
+        gs.undoMove()
+    return (turn_multiplier * BatchEvaluation.scoreBatch(positions)).tolist()
+
+
+def evaluateBoard(gs):
+    """
+    Same score as scoreBoard, read in O(1) from the material and piece-square totals that GameState keeps up to
+    date in makeMove/undoMove.
+    """
+    if gs.checkmate:
+        return -CHECKMATE if gs.whiteToMove else CHECKMATE
+    elif gs.stalemate:
+        return STALEMATE
+    score = (gs.materialScore + gs.positionScore) / 100
+    if DEBUG_EVALUATION:
+        full_score = scoreBoard(gs)
+        if abs(full_score - score) > 1e-6:
+            raise AssertionError("incremental evaluation " + str(score) + " != scoreBoard " + str(full_score))
+    return score
+
+
 def scoreBoard(gs):
     """
     Score the board. A positive score is good for white, a negative score is good for black.
@@ -0,0 +1,191 @@
+# Bulk analysis of positions: reads FEN or EPD records one at a time from a file or stdin, searches them over a
+# process pool and writes one JSON line per record, in input order:
+#   {"index": 0, "fen": "...", "id": "...", "bestmove": "e2e4", "score": 35, "mate": null, "depth": 5,
+#    "nodes": 12345, "time": 0.42, "pv": ["e2e4", "e7e5"]}
+# score is in centipawns for the side to move; mate, when the search found one, is the number of moves to mate
+# (negative when the side to move is mated). A position without a legal move gets "bestmove": null and a "result",
+# "checkmate" or "stalemate". A record that can't be read or searched gets an "error" instead, and the run goes on.
+# Only a window of records is in flight at a time, so memory stays bounded however long the input is, and since the
+# output is in input order, --resume skips the records already in the output file and carries on after them.
+# Run from the Chess directory:
+#   python -m Engine.Analysis positions.epd --output results.jsonl [--depth 6 | --nodes 200000] [--resume]
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import deque
+from multiprocessing import Pool
+from Engine import AI
+from Engine import Backends
+
+DEFAULT_DEPTH = 4
+WINDOW_PER_PROCESS = 4  # records in flight per pool process
+
+
+def parseRecord(line):
+    """
+    Returns (fen, operations) for a FEN or EPD line, or None for a blank or comment line.
+    Missing halfmove and fullmove counters are filled in; operations maps EPD opcodes to their operands.
+    """
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    fields = line.split()
+    if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit():
+        return ' '.join(fields[:6]), parseOperations(' '.join(fields[6:]))
+    return ' '.join(fields[:4] + ['0', '1']), parseOperations(' '.join(fields[4:]))
+
+
+def parseOperations(text):
+    operations = {}
+    for operation in text.split(';'):
+        opcode, _, operand = operation.strip().partition(' ')
+        if opcode:
+            operations[opcode] = operand.strip().strip('"')
+    return operations
+
+
+def readRecords(lines, skip=0):
+    """
+    Yields (index, fen, operations) for the records of an iterable of lines, starting after the first skip records.
+    """
+    index = 0
+    for line in lines:
+        record = parseRecord(line)
+        if record is None:
+            continue
+        if index >= skip:
+            yield (index,) + record
+        index += 1
+
+
+def initWorker(hash_size_mb):
+    random.seed()
+    AI.setHashSize(hash_size_mb)
+
+
+def analysePosition(task):
+    """
+    Searches one record in a pool process and returns its result dict. Any failure becomes the record's error, so
+    one bad position can't end the whole run.
+    """
+    index, fen, operations, limits, backend = task
+    result = {'index': index, 'fen': fen}
+    if 'id' in operations:
+        result['id'] = operations['id']
+    try:
+        gs = Backends.createGameState(backend, fen)
+    except (ValueError, KeyError, IndexError) as error:
+        result['error'] = "bad FEN: " + str(error)
+        return result
+    try:
+        searchPosition(gs, limits, result)
+    except Exception as error:
+        for key in ('score', 'mate', 'bestmove', 'result'):
+            result.pop(key, None)
+        result['error'] = "%s: %s" % (type(error).__name__, error)
+    return result
+
+
+def searchPosition(gs, limits, result):
+    """
+    Searches gs and adds the outcome to result.
+    """
+    valid_moves = gs.getValidMoves()
+    if not valid_moves:
+        result.update({'bestmove': None, 'result': "checkmate" if gs.checkmate else "stalemate", 'pv': []})
+        return
+    AI.transposition_table.clear()  # every record is searched from scratch, so results don't depend on the order
+    AI.move_orderer.clear()
+    start_time = time.perf_counter()
+    move = AI.findBestMove(gs, valid_moves, move_time=None, **limits)
+    info = AI.searchInfo(gs, start_time)
+    mate = AI.mateDistance(info['score'])
+    if mate is not None:
+        result['score'], result['mate'] = None, mate
+    else:
+        result['score'], result['mate'] = int(round(info['score'] * 100)), None
+    result.update({'bestmove': move.getUciNotation(), 'depth': info['depth'], 'nodes': info['nodes'] + info['qnodes'],
+                   'time': round(info['time'], 4), 'pv': info['pv']})
+
+
+def completedRecords(path):
+    """
+    Number of complete results in an output file; a line cut short by an interrupted run is removed.
+    """
+    if not os.path.exists(path):
+        return 0
+    count = 0
+    good_size = 0
+    with open(path, 'rb') as output_file:
+        for line in output_file:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                json.loads(line)
+            except ValueError:
+                break
+            count += 1
+            good_size += len(line)
+    if good_size != os.path.getsize(path):
+        with open(path, 'r+b') as output_file:
+            output_file.truncate(good_size)
+    return count
+
+
+def analyse(lines, output, limits, concurrency, skip=0, backend=Backends.DEFAULT_BACKEND,
+            hash_size_mb=AI.HASH_SIZE_MB):
+    """
+    Analyses the records of lines after the first skip and writes their results to the output file object in order.
+    Returns the number of records written.
+    """
+    written = 0
+    with Pool(concurrency, initializer=initWorker, initargs=(hash_size_mb,)) as pool:
+        pending = deque()
+        records = readRecords(lines, skip)
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < concurrency * WINDOW_PER_PROCESS:
+                record = next(records, None)
+                if record is None:
+                    exhausted = True
+                else:
+                    pending.append(pool.apply_async(analysePosition, (record + (limits, backend),)))
+            if pending:
+                output.write(json.dumps(pending.popleft().get()) + '\n')
+                output.flush()
+                written += 1
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse FEN or EPD positions in bulk")
+    parser.add_argument('input', help="FEN or EPD file, - for stdin")
+    parser.add_argument('--output', '-o', help="JSON lines file, stdout if left out")
+    parser.add_argument('--depth', type=int, help="search depth, %d unless --nodes is given" % DEFAULT_DEPTH)
+    parser.add_argument('--nodes', type=int, help="nodes per position, main and quiescence search together")
+    parser.add_argument('--concurrency', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--hash', type=int, default=AI.HASH_SIZE_MB, help="transposition table MB per process")
+    parser.add_argument('--backend', default=Backends.DEFAULT_BACKEND, choices=sorted(Backends.BACKENDS))
+    parser.add_argument('--resume', action='store_true', help="skip the records already in the output file")
+    args = parser.parse_args(argv)
+    if args.resume and not args.output:
+        parser.error("--resume needs --output")
+    limits = {'max_depth': args.depth or (AI.MAX_DEPTH if args.nodes else DEFAULT_DEPTH), 'max_nodes': args.nodes}
+    skip = completedRecords(args.output) if args.resume else 0
+    input_file = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8', errors='replace')
+    output = open(args.output, 'a' if args.resume else 'w') if args.output else sys.stdout
+    try:
+        written = analyse(input_file, output, limits, args.concurrency, skip, args.backend, args.hash)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output is not sys.stdout:
+            output.close()
+    sys.stderr.write("analysed %d positions%s\n" % (written, " after %d done before" % skip if skip else ""))
+
+
+if __name__ == '__main__':
+    main()
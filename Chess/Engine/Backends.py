@@ -0,0 +1,20 @@
+# Move generation backends. Both classes share the GameState interface (getValidMoves/makeMove/undoMove, board,
+# moveLog, whiteToMove, checkmate, stalemate), so the UI and AI work with either one.
+from Engine import ChessEngine
+from Engine import BitboardEngine
+
+BACKENDS = {
+    'mailbox': ChessEngine.GameState,
+    'bitboard': BitboardEngine.BitboardGameState,
+}
+
+DEFAULT_BACKEND = 'mailbox'
+
+
+def createGameState(backend=DEFAULT_BACKEND, fen=None):
+    if backend not in BACKENDS:
+        raise ValueError("unknown backend " + repr(backend) + ", expected one of " + ", ".join(sorted(BACKENDS)))
+    gs = BACKENDS[backend]()
+    if fen is not None:
+        gs.loadFen(fen)
+    return gs
@@ -0,0 +1,87 @@
+# Vectorised evaluation of many positions at once.
+# Positions are stacked into an (N, 64) array of piece codes (see Mailbox, squares in a8..h1 order) and scored with
+# numpy against precomputed (12, 64) material + piece-square tables, giving the same scores as AI.scoreBoard.
+import numpy as np
+from Engine import Evaluation
+from Engine.Mailbox import PIECE_CODES, PIECE_NAMES, SQUARES, EMPTY
+
+PIECES = ['wp', 'wN', 'wB', 'wR', 'wQ', 'wK', 'bp', 'bN', 'bB', 'bR', 'bQ', 'bK']
+
+# (12, 64) centipawn values of each piece on each square, white positive
+PIECE_TABLES = np.array([[Evaluation.MATERIAL_VALUES[PIECE_CODES[name]] +
+                          Evaluation.PIECE_SQUARE_VALUES[PIECE_CODES[name]][s] for s in SQUARES]
+                         for name in PIECES], dtype=np.int64)
+# one extra row of zeros for empty squares, so lookups need no masking
+_LOOKUP_TABLES = np.vstack([PIECE_TABLES, np.zeros((1, 64), dtype=np.int64)])
+
+# piece code -> row of PIECE_TABLES, 12 (the zero row) for empty squares
+PIECE_ROWS = np.full(len(PIECE_NAMES), len(PIECES), dtype=np.int64)
+for _row, _name in enumerate(PIECES):
+    PIECE_ROWS[PIECE_CODES[_name]] = _row
+
+_FEN_CODES = {'P': 'wp', 'N': 'wN', 'B': 'wB', 'R': 'wR', 'Q': 'wQ', 'K': 'wK',
+              'p': 'bp', 'n': 'bN', 'b': 'bB', 'r': 'bR', 'q': 'bQ', 'k': 'bK'}
+_SQUARE_INDEX = np.arange(64)
+
+
+def positionArray(gs):
+    """
+    Returns the 64 piece codes of a GameState as a numpy array.
+    """
+    squares = gs.squares
+    return np.array([squares[s] for s in SQUARES], dtype=np.int8)
+
+
+def fenToArray(fen):
+    """
+    Returns the 64 piece codes of the board field of a FEN, without building a GameState.
+    """
+    codes = []
+    for ch in fen.split()[0]:
+        if ch.isdigit():
+            codes.extend([EMPTY] * int(ch))
+        elif ch != '/':
+            codes.append(PIECE_CODES[_FEN_CODES[ch]])
+    if len(codes) != 64:
+        raise ValueError("FEN board does not describe 64 squares: " + fen)
+    return np.array(codes, dtype=np.int8)
+
+
+def scoreBatch(positions):
+    """
+    Scores an (N, 64) array, or a list of N arrays, of piece codes.
+    Returns N material + piece-square scores in pawns, white positive.
+    """
+    positions = np.asarray(positions)
+    rows = PIECE_ROWS[positions.astype(np.int64)]
+    return _LOOKUP_TABLES[rows, _SQUARE_INDEX].sum(axis=1) / 100
+
+
+def scoreStates(states, checkmate_score=1000, stalemate_score=0):
+    """
+    Scores a list of GameStates exactly like AI.scoreBoard, including its checkmate and stalemate scores.
+    """
+    if len(states) == 0:
+        return np.zeros(0)
+    scores = scoreBatch(np.stack([positionArray(gs) for gs in states]))
+    for i, gs in enumerate(states):
+        if gs.checkmate:
+            scores[i] = -checkmate_score if gs.whiteToMove else checkmate_score
+        elif gs.stalemate:
+            scores[i] = stalemate_score
+    return scores
+
+
+def scoreFens(fens, chunk_size=4096):
+    """
+    Scores an iterable of FEN strings (material + piece-square only), chunk_size positions per numpy call,
+    yielding one score per FEN.
+    """
+    chunk = []
+    for fen in fens:
+        chunk.append(fenToArray(fen))
+        if len(chunk) == chunk_size:
+            yield from scoreBatch(chunk).tolist()
+            chunk = []
+    if chunk:
+        yield from scoreBatch(chunk).tolist()
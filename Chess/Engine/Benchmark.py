@@ -0,0 +1,172 @@
+# Micro-benchmarks of the engine's hot paths on an opening, a middlegame and an endgame position, with stored
+# baselines so that a change that slows one of them down is caught. Run from the Chess directory:
+#   python -m Engine.Benchmark --save baseline.json        time everything and write a baseline
+#   python -m Engine.Benchmark --compare baseline.json     time again and report regressions (exit status 1)
+# Each benchmark reports the best time per call over --repeat runs; the best is the least disturbed by other load.
+# A baseline stores the time and a regression threshold for every benchmark (THRESHOLDS, --threshold or edited in
+# the file); the comparison fails when a benchmark got slower by more than its threshold.
+import argparse
+import io
+import json
+import platform
+import sys
+import timeit
+from Engine import AI
+from Engine import Backends
+from Engine import ChessMove
+from Engine import MoveOrdering
+from Engine import TranspositionTable
+
+BENCHMARK_POSITIONS = [
+    ("opening", "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3"),
+    ("middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10"),
+    ("endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"),
+]
+SEARCH_DEPTH = 3
+SEARCH_HASH_MB = 1  # small, so that clearing it before every search costs little
+REPEAT = 5
+MIN_RUN_TIME = 0.2  # seconds per run; the number of calls per run is chosen to take at least this long
+DEFAULT_THRESHOLD = 0.10
+THRESHOLDS = {'search': 0.15}  # benchmark kind -> allowed slowdown; searches vary more from run to run
+BASELINE_VERSION = 1
+
+
+def benchmarkFunctions(gs):
+    """
+    Returns (kind, function, calls) for every benchmark of a position; one function call makes calls calls of the
+    code being measured.
+    """
+    moves = gs.getValidMoves()
+    squares = [((move.startRow, move.startCol), (move.endRow, move.endCol)) for move in moves]
+    board = gs.board
+    turn_multiplier = 1 if gs.whiteToMove else -1
+
+    def makeUndo():
+        for move in moves:
+            gs.makeMove(move)
+            gs.undoMove()
+
+    def construct():
+        for start, end in squares:
+            ChessMove.Move(start, end, board)
+
+    def search():
+        AI.transposition_table.clear()
+        AI.move_orderer.clear()
+        AI.root_ply = len(gs.moveLog)
+        AI.findMoveNegaMaxAlphaBeta(gs, gs.getValidMoves(), SEARCH_DEPTH, -AI.CHECKMATE, AI.CHECKMATE,
+                                    turn_multiplier)
+
+    return [
+        ('getValidMoves', gs.getValidMoves, 1),
+        ('checkForPinsAndChecks', gs.checkForPinsAndChecks, 1),
+        ('makeMove/undoMove', makeUndo, len(moves)),
+        ('scoreBoard', lambda: AI.scoreBoard(gs), 1),
+        ('Move', construct, len(squares)),
+        ('search', search, 1),
+    ]
+
+
+def calibrate(function):
+    """
+    Returns a timeit.Timer for function and the number of calls that make a run of at least MIN_RUN_TIME seconds.
+    """
+    timer = timeit.Timer(function)
+    number, run_time = timer.autorange()
+    return timer, max(1, int(number * MIN_RUN_TIME / run_time)) if run_time > 0 else number
+
+
+def runBenchmarks(backend=Backends.DEFAULT_BACKEND, name_filter=None, repeat=REPEAT, out=sys.stdout):
+    """
+    Returns {benchmark name: seconds per call}. Names are "kind/position", e.g. "getValidMoves/opening".
+    The runs go round all the benchmarks repeat times rather than timing each one repeat times in a row, so that a
+    burst of load on the machine spoils at most one run of a benchmark.
+    """
+    saved = AI.transposition_table, AI.move_orderer, AI.deadline, AI.node_limit
+    AI.transposition_table = TranspositionTable.TranspositionTable(SEARCH_HASH_MB)
+    AI.move_orderer = MoveOrdering.MoveOrderer()
+    AI.deadline = AI.node_limit = None
+    try:
+        benchmarks = []  # (name, timer, number, calls)
+        for position_name, fen in BENCHMARK_POSITIONS:
+            gs = Backends.createGameState(backend, fen)
+            for kind, function, calls in benchmarkFunctions(gs):
+                name = kind + '/' + position_name
+                if not name_filter or name_filter in name:
+                    benchmarks.append((name,) + calibrate(function) + (calls,))
+        results = {}
+        for _ in range(repeat):
+            for name, timer, number, calls in benchmarks:
+                seconds = timer.timeit(number) / number / calls
+                results[name] = min(seconds, results.get(name, seconds))
+    finally:
+        AI.transposition_table, AI.move_orderer, AI.deadline, AI.node_limit = saved
+    for name, seconds in results.items():
+        out.write("%-34s %12.2f us\n" % (name, seconds * 1e6))
+    return results
+
+
+def saveBaseline(path, results, backend, threshold=None):
+    benchmarks = {}
+    for name, seconds in results.items():
+        kind = name.split('/')[0]
+        benchmarks[name] = {'seconds': seconds,
+                            'threshold': threshold if threshold is not None else THRESHOLDS.get(kind,
+                                                                                                DEFAULT_THRESHOLD)}
+    baseline = {'version': BASELINE_VERSION, 'backend': backend, 'python': platform.python_version(),
+                'machine': platform.machine(), 'benchmarks': benchmarks}
+    with open(path, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write('\n')
+
+
+def compareBaseline(path, results, threshold=None, out=sys.stdout):
+    """
+    Prints every benchmark's change against the baseline and returns the names of those that regressed.
+    """
+    with open(path) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get('version') != BASELINE_VERSION:
+        raise ValueError("unsupported baseline version " + str(baseline.get('version')))
+    regressions = []
+    for name, seconds in results.items():
+        entry = baseline['benchmarks'].get(name)
+        if entry is None:
+            out.write("%-34s %12.2f us  (not in the baseline)\n" % (name, seconds * 1e6))
+            continue
+        allowed = threshold if threshold is not None else entry['threshold']
+        change = seconds / entry['seconds'] - 1
+        regressed = change > allowed
+        if regressed:
+            regressions.append(name)
+        out.write("%-34s %12.2f us  was %10.2f us  %+6.1f%%%s\n" % (
+            name, seconds * 1e6, entry['seconds'] * 1e6, 100 * change,
+            "  REGRESSION (allowed %+.0f%%)" % (100 * allowed) if regressed else ""))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Engine hot path micro-benchmarks")
+    parser.add_argument('--save', metavar='PATH', help="write the results as a baseline")
+    parser.add_argument('--compare', metavar='PATH', help="compare the results against a baseline")
+    parser.add_argument('--threshold', type=float,
+                        help="allowed slowdown as a fraction, e.g. 0.1, instead of the per-benchmark thresholds")
+    parser.add_argument('--filter', help="only run benchmarks whose name contains this")
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--backend', default=Backends.DEFAULT_BACKEND, choices=sorted(Backends.BACKENDS))
+    args = parser.parse_args(argv)
+    # with --compare the times are printed next to the baseline instead
+    results = runBenchmarks(args.backend, args.filter, args.repeat, out=io.StringIO() if args.compare else sys.stdout)
+    if args.save:
+        saveBaseline(args.save, results, args.backend, args.threshold)
+        print("baseline written to " + args.save)
+    if args.compare:
+        regressions = compareBaseline(args.compare, results, args.threshold)
+        if regressions:
+            print("%d of %d benchmarks regressed" % (len(regressions), len(results)))
+            sys.exit(1)
+        print("no regressions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,504 @@
+# Bitboard move generation backend.
+# BitboardGameState keeps a 64 bit occupancy mask per piece code next to the mailbox and generates legal moves from
+# precomputed knight/king/pawn attack tables and classical ray lookups for sliding pieces. It inherits makeMove and
+# undoMove (and with them the move log, Zobrist key and board view) from GameState, toggling the move's bits on top,
+# so it can be used anywhere a GameState is expected. The move lookups of the search (getMoveByID, hasLegalMove) are
+# answered from the bitboards too. Bit i is the square at row i // 8, col i % 8 (a8 = 0, h1 = 63).
+from Engine import ChessEngine
+from Engine.ChessMove import SQUARE_MASK, TO_SHIFT, ENPASSANT_FLAG, CASTLE_FLAG, fromSquares
+from Engine.Mailbox import EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK, COLOR_MASK, TYPE_MASK, \
+    ROOK_DIRECTIONS, BISHOP_DIRECTIONS, KING_DIRECTIONS, KNIGHT_OFFSETS, NW, NE, SW, SE, N, S, E, W, SQUARES
+
+BIT_INDEX = [-1] * 120  # mailbox square -> bit index, -1 for the border
+SQUARE_BITS = [0] * 120  # mailbox square -> its bit, 0 for the border
+for _i, _s in enumerate(SQUARES):
+    BIT_INDEX[_s] = _i
+    SQUARE_BITS[_s] = 1 << _i
+# Moves never change once made, so addMoves makes each move of a piece from a square only once and hands out the
+# same object ever after: MOVE_CACHES[piece code][start bit index] maps end bit index << 5 | captured piece code to
+# the move
+MOVE_CACHES = [[{} for _ in range(64)] for _ in range(24)]
+
+
+def _leaperAttacks(offsets):
+    table = [0] * 64
+    for i, s in enumerate(SQUARES):
+        for offset in offsets:
+            if BIT_INDEX[s + offset] >= 0:
+                table[i] |= 1 << BIT_INDEX[s + offset]
+    return table
+
+
+KNIGHT_ATTACKS = _leaperAttacks(KNIGHT_OFFSETS)
+KING_ATTACKS = _leaperAttacks(KING_DIRECTIONS)
+PAWN_ATTACKS = {WHITE: _leaperAttacks((NW, NE)), BLACK: _leaperAttacks((SW, SE))}
+ALL_SQUARES = (1 << 64) - 1
+PROMOTION_RANKS = 0xFF | (0xFF << 56)
+
+# RAYS[direction][i]: every square from i (exclusive) to the edge of the board in that direction.
+# Directions are mailbox offsets; a positive offset always moves to a higher bit index.
+RAYS = {}
+for _d in KING_DIRECTIONS:
+    RAYS[_d] = [0] * 64
+    for _i, _s in enumerate(SQUARES):
+        _t = _s + _d
+        while BIT_INDEX[_t] >= 0:
+            RAYS[_d][_i] |= 1 << BIT_INDEX[_t]
+            _t += _d
+
+# BETWEEN[i][j]: squares strictly between two squares on a common line, 0 if they are not aligned
+BETWEEN = [[0] * 64 for _ in range(64)]
+for _d in KING_DIRECTIONS:
+    for _i, _s in enumerate(SQUARES):
+        _between = 0
+        _t = _s + _d
+        while BIT_INDEX[_t] >= 0:
+            BETWEEN[_i][BIT_INDEX[_t]] = _between
+            _between |= 1 << BIT_INDEX[_t]
+            _t += _d
+
+ROOK_RAYS = [RAYS[N][i] | RAYS[S][i] | RAYS[E][i] | RAYS[W][i] for i in range(64)]
+BISHOP_RAYS = [RAYS[NW][i] | RAYS[NE][i] | RAYS[SW][i] | RAYS[SE][i] for i in range(64)]
+
+# (rays towards higher bit indices, rays towards lower ones) per piece, so that slidingAttacks looks nothing up by
+# direction and knows which end of the blockers is the nearest without a test
+ROOK_RAY_TABLES = (tuple(RAYS[d] for d in ROOK_DIRECTIONS if d > 0), tuple(RAYS[d] for d in ROOK_DIRECTIONS if d < 0))
+BISHOP_RAY_TABLES = (tuple(RAYS[d] for d in BISHOP_DIRECTIONS if d > 0),
+                     tuple(RAYS[d] for d in BISHOP_DIRECTIONS if d < 0))
+QUEEN_RAY_TABLES = (ROOK_RAY_TABLES[0] + BISHOP_RAY_TABLES[0], ROOK_RAY_TABLES[1] + BISHOP_RAY_TABLES[1])
+RAY_TABLES = {BISHOP: BISHOP_RAY_TABLES, ROOK: ROOK_RAY_TABLES, QUEEN: QUEEN_RAY_TABLES}
+
+WHITE_DOUBLE_PUSH_RANK = 0xFF << 32  # 4th rank, where a white double push lands
+BLACK_DOUBLE_PUSH_RANK = 0xFF << 24
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+
+
+def slidingAttacks(i, ray_tables, occupied):
+    attacks = 0
+    up, down = ray_tables
+    for rays in up:
+        ray = rays[i]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[(blockers & -blockers).bit_length() - 1]  # cut the ray off behind the first blocker
+        attacks |= ray
+    for rays in down:
+        ray = rays[i]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+
+def rookAttacks(i, occupied):
+    return slidingAttacks(i, ROOK_RAY_TABLES, occupied)
+
+
+def bishopAttacks(i, occupied):
+    return slidingAttacks(i, BISHOP_RAY_TABLES, occupied)
+
+
+class BitboardGameState(ChessEngine.GameState):
+    def loadFen(self, fen):
+        super().loadFen(fen)
+        self.rebuildBitboards()
+
+    def rebuildBitboards(self):
+        self.bitboards = [0] * 24  # indexed by piece code
+        for i, s in enumerate(SQUARES):
+            if self.squares[s] != EMPTY:
+                self.bitboards[self.squares[s]] |= 1 << i
+        self.colorBitboards = [0] * 24  # indexed by color, WHITE or BLACK
+        for piece_type in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING):
+            self.colorBitboards[WHITE] |= self.bitboards[WHITE | piece_type]
+            self.colorBitboards[BLACK] |= self.bitboards[BLACK | piece_type]
+
+    def updateBitboards(self, move, moved, placed, captured):
+        """
+        Toggles the bits of a move, which makes it on the bitboards and takes it back as well. moved is the piece on
+        the start square before the move and placed the one on the end square after it, which differ on a promotion.
+        """
+        code = move.code
+        start = code & SQUARE_MASK
+        end = code >> TO_SHIFT & SQUARE_MASK
+        start_bit = SQUARE_BITS[start]
+        end_bit = SQUARE_BITS[end]
+        bb = self.bitboards
+        color_bb = self.colorBitboards
+        color = moved & COLOR_MASK
+        bb[moved] ^= start_bit
+        bb[placed] ^= end_bit
+        color_bb[color] ^= start_bit | end_bit
+        if code & ENPASSANT_FLAG:
+            captured_bit = SQUARE_BITS[start - start % 10 + end % 10]
+            bb[captured] ^= captured_bit
+            color_bb[captured & COLOR_MASK] ^= captured_bit
+        elif captured != EMPTY:
+            bb[captured] ^= end_bit
+            color_bb[captured & COLOR_MASK] ^= end_bit
+        elif code & CASTLE_FLAG:
+            rook_bits = SQUARE_BITS[end + 1] | SQUARE_BITS[end - 1] if end > start else \
+                SQUARE_BITS[end - 2] | SQUARE_BITS[end + 1]
+            bb[color | ROOK] ^= rook_bits
+            color_bb[color] ^= rook_bits
+
+    def makeMove(self, move):
+        code = move.code
+        squares = self.squares
+        moved = squares[code & SQUARE_MASK]
+        captured = squares[code >> TO_SHIFT & SQUARE_MASK]
+        if code & ENPASSANT_FLAG:
+            captured = moved ^ COLOR_MASK
+        super().makeMove(move)
+        self.updateBitboards(move, moved, squares[code >> TO_SHIFT & SQUARE_MASK], captured)
+
+    def undoMove(self):
+        if len(self.moveLog) != 0:
+            move = self.moveLog[-1]
+            placed = self.squares[move.code >> TO_SHIFT & SQUARE_MASK]
+            super().undoMove()
+            self.updateBitboards(move, move.moved, placed, move.captured)
+
+    def hasNonPawnMaterial(self):
+        color = WHITE if self.whiteToMove else BLACK
+        bb = self.bitboards
+        return (bb[color | KNIGHT] | bb[color | BISHOP] | bb[color | ROOK] | bb[color | QUEEN]) != 0
+
+    # returns a bitboard of the pieces of by_color attacking bit index i, given the occupancy
+    def attackersOf(self, i, by_color, occupied):
+        bb = self.bitboards
+        other = BLACK if by_color == WHITE else WHITE
+        attackers = PAWN_ATTACKS[other][i] & bb[by_color | PAWN]
+        attackers |= KNIGHT_ATTACKS[i] & bb[by_color | KNIGHT]
+        attackers |= KING_ATTACKS[i] & bb[by_color | KING]
+        rooks_queens = bb[by_color | ROOK] | bb[by_color | QUEEN]
+        if rooks_queens & ROOK_RAYS[i]:
+            attackers |= rookAttacks(i, occupied) & rooks_queens
+        bishops_queens = bb[by_color | BISHOP] | bb[by_color | QUEEN]
+        if bishops_queens & BISHOP_RAYS[i]:
+            attackers |= bishopAttacks(i, occupied) & bishops_queens
+        return attackers
+
+    def squareUnderAttack(self, s):
+        opp_color = BLACK if self.whiteToMove else WHITE
+        occupied = self.colorBitboards[WHITE] | self.colorBitboards[BLACK]
+        return self.attackersOf(BIT_INDEX[s], opp_color, occupied) != 0
+
+    def inCheck(self):
+        return self.squareUnderAttack(self.whiteKingSquare if self.whiteToMove else self.blackKingSquare)
+
+    # returns {bit index of pinned piece: mask of squares it may still move to}
+    def getPinMasks(self, king, ally_color, opp_color, occupied):
+        bb = self.bitboards
+        pins = {}
+        snipers = (ROOK_RAYS[king] & (bb[opp_color | ROOK] | bb[opp_color | QUEEN])) | \
+                  (BISHOP_RAYS[king] & (bb[opp_color | BISHOP] | bb[opp_color | QUEEN]))
+        while snipers:
+            low = snipers & -snipers
+            snipers ^= low
+            sniper = low.bit_length() - 1
+            blockers = BETWEEN[king][sniper] & occupied
+            if blockers and not blockers & (blockers - 1) and blockers & self.colorBitboards[ally_color]:
+                pins[blockers.bit_length() - 1] = BETWEEN[king][sniper] | low
+        return pins
+
+    def getValidMoves(self):
+        return self.generateMoves(False)
+
+    # the legal move with the given moveID, or None, generating only the moves of the piece on its start square that
+    # end on its end square. Like GameState.getMoveByID, it finds no castling move and no move while in check
+    def getMoveByID(self, move_id):
+        if move_id is None or move_id < 0:
+            return None
+        start = move_id & SQUARE_MASK
+        end = move_id >> TO_SHIFT & SQUARE_MASK
+        squares = self.squares
+        if self.whiteToMove:
+            ally_color, opp_color = WHITE, BLACK
+        else:
+            ally_color, opp_color = BLACK, WHITE
+        piece = squares[start] if start < 120 else EMPTY
+        if not piece & ally_color or end >= 120 or BIT_INDEX[end] < 0:
+            return None
+        allies = self.colorBitboards[ally_color]
+        enemies = self.colorBitboards[opp_color]
+        occupied = allies | enemies
+        king = BIT_INDEX[self.whiteKingSquare if self.whiteToMove else self.blackKingSquare]
+        self.in_check = self.attackersOf(king, opp_color, occupied) != 0
+        if self.in_check:
+            return None
+        i = BIT_INDEX[start]
+        to = BIT_INDEX[end]
+        to_bit = 1 << to
+        piece_type = piece & TYPE_MASK
+        moves = []
+        if piece_type == KING:
+            if KING_ATTACKS[i] & to_bit & ~allies and not self.attackersOf(to, opp_color, occupied ^ (1 << i)):
+                moves.append(fromSquares(start, end, piece, squares[end]))
+        else:
+            pins = self.getPinMasks(king, ally_color, opp_color, occupied)
+            if i in pins and not pins[i] & to_bit:
+                return None
+            if piece_type == PAWN:
+                self.addPawnMoves(ally_color, opp_color, occupied, to_bit, pins, moves)
+            else:
+                attacks = KNIGHT_ATTACKS[i] if piece_type == KNIGHT else \
+                    slidingAttacks(i, RAY_TABLES[piece_type], occupied)
+                self.addMoves(i, attacks & to_bit & ~allies, enemies, moves)
+        for move in moves:
+            if move.moveID == move_id:
+                return move
+        return None
+
+    # whether the side to move has any legal move, stopping at the first piece found to have one. Castling needs no
+    # test: the king can only castle if it can also step to the square next to it
+    def hasLegalMove(self):
+        bb = self.bitboards
+        if self.whiteToMove:
+            ally_color, opp_color = WHITE, BLACK
+        else:
+            ally_color, opp_color = BLACK, WHITE
+        allies = self.colorBitboards[ally_color]
+        occupied = allies | self.colorBitboards[opp_color]
+        king = BIT_INDEX[self.whiteKingSquare if self.whiteToMove else self.blackKingSquare]
+        checkers = self.attackersOf(king, opp_color, occupied)
+        self.in_check = checkers != 0
+        targets = KING_ATTACKS[king] & ~allies
+        while targets:
+            low = targets & -targets
+            targets ^= low
+            if not self.attackersOf(low.bit_length() - 1, opp_color, occupied ^ (1 << king)):
+                return True
+        if checkers & (checkers - 1):
+            return False
+        check_mask = checkers | BETWEEN[king][checkers.bit_length() - 1] if checkers else ALL_SQUARES
+        pins = self.getPinMasks(king, ally_color, opp_color, occupied)
+        allowed = ~allies & check_mask
+        pieces = bb[ally_color | KNIGHT]
+        while pieces:
+            low = pieces & -pieces
+            pieces ^= low
+            start = low.bit_length() - 1
+            if start not in pins and KNIGHT_ATTACKS[start] & allowed:
+                return True
+        for piece_type, ray_tables in ((QUEEN, QUEEN_RAY_TABLES), (ROOK, ROOK_RAY_TABLES),
+                                       (BISHOP, BISHOP_RAY_TABLES)):
+            pieces = bb[ally_color | piece_type]
+            while pieces:
+                low = pieces & -pieces
+                pieces ^= low
+                start = low.bit_length() - 1
+                targets = slidingAttacks(start, ray_tables, occupied) & allowed
+                if start in pins:
+                    targets &= pins[start]
+                if targets:
+                    return True
+        moves = []
+        self.addPawnMoves(ally_color, opp_color, occupied, check_mask, pins, moves)
+        return len(moves) > 0
+
+    # legal captures and promotions for quiescence search, or every legal move when in check
+    def getCaptureMoves(self):
+        return self.generateMoves(True)
+
+    # legal moves that are neither captures nor promotions, castling included, for a side that is not in check
+    def getQuietMoves(self):
+        return self.generateMoves(False, True)
+
+    def generateMoves(self, captures_only, quiets_only=False):
+        moves = []
+        bb = self.bitboards
+        if self.whiteToMove:
+            ally_color, opp_color = WHITE, BLACK
+        else:
+            ally_color, opp_color = BLACK, WHITE
+        allies = self.colorBitboards[ally_color]
+        enemies = self.colorBitboards[opp_color]
+        occupied = allies | enemies
+        king = BIT_INDEX[self.whiteKingSquare if self.whiteToMove else self.blackKingSquare]
+        king_bit = 1 << king
+        checkers = self.attackersOf(king, opp_color, occupied)
+        self.in_check = checkers != 0
+        if self.in_check:
+            captures_only = False  # every evasion is needed to tell whether it is checkmate
+        if not captures_only and not quiets_only:
+            self.legalGenerations += 1
+        if captures_only:
+            targets_allowed = enemies
+        elif quiets_only:
+            targets_allowed = ~occupied & ALL_SQUARES
+        else:
+            targets_allowed = ~allies & ALL_SQUARES
+
+        # king moves, tested with the king removed so it can't hide behind itself on a slider's line
+        targets = KING_ATTACKS[king] & targets_allowed
+        safe = 0
+        while targets:
+            low = targets & -targets
+            targets ^= low
+            if not self.attackersOf(low.bit_length() - 1, opp_color, occupied ^ king_bit):
+                safe |= low
+        self.addMoves(king, safe, enemies, moves)
+
+        if checkers & (checkers - 1):  # double check, king must move
+            self.setGameOver(moves)
+            return moves
+        if checkers:  # other pieces must capture the checker or block the check
+            check_mask = checkers | BETWEEN[king][checkers.bit_length() - 1]
+        else:
+            check_mask = ALL_SQUARES
+        pins = self.getPinMasks(king, ally_color, opp_color, occupied)
+        allowed = targets_allowed & check_mask
+
+        pieces = bb[ally_color | KNIGHT]
+        while pieces:
+            low = pieces & -pieces
+            pieces ^= low
+            start = low.bit_length() - 1
+            if start not in pins:  # a pinned knight can never move
+                self.addMoves(start, KNIGHT_ATTACKS[start] & allowed, enemies, moves)
+        for piece_type, ray_tables in ((BISHOP, BISHOP_RAY_TABLES), (ROOK, ROOK_RAY_TABLES),
+                                       (QUEEN, QUEEN_RAY_TABLES)):
+            pieces = bb[ally_color | piece_type]
+            while pieces:
+                low = pieces & -pieces
+                pieces ^= low
+                start = low.bit_length() - 1
+                targets = slidingAttacks(start, ray_tables, occupied) & allowed
+                if start in pins:
+                    targets &= pins[start]
+                self.addMoves(start, targets, enemies, moves)
+        self.addPawnMoves(ally_color, opp_color, occupied, check_mask, pins, moves, captures_only, quiets_only)
+        if captures_only:
+            return moves  # says nothing about checkmate or stalemate
+        if not checkers:
+            self.addCastleMoves(king, opp_color, occupied, moves)
+        if quiets_only:
+            return moves
+        self.setGameOver(moves)
+        return moves
+
+    # moves of the piece (not a pawn, whose moves may be promotions) on bit index start to targets
+    def addMoves(self, start, targets, enemies, moves):
+        squares = self.squares
+        start_square = SQUARES[start]
+        piece = squares[start_square]
+        cache = MOVE_CACHES[piece][start]
+        captures = targets & enemies
+        targets ^= captures
+        while captures:
+            low = captures & -captures
+            captures ^= low
+            to = low.bit_length() - 1
+            captured = squares[SQUARES[to]]
+            move = cache.get(to << 5 | captured)
+            if move is None:
+                move = cache[to << 5 | captured] = fromSquares(start_square, SQUARES[to], piece, captured)
+            moves.append(move)
+        while targets:
+            low = targets & -targets
+            targets ^= low
+            to = low.bit_length() - 1
+            move = cache.get(to << 5)
+            if move is None:
+                move = cache[to << 5] = fromSquares(start_square, SQUARES[to], piece, EMPTY)
+            moves.append(move)
+
+    def addPawnMoves(self, ally_color, opp_color, occupied, check_mask, pins, moves, captures_only=False,
+                     quiets_only=False):
+        pawns = self.bitboards[ally_color | PAWN]
+        enemies = self.colorBitboards[opp_color]
+        empty = ~occupied & ALL_SQUARES
+        if ally_color == WHITE:
+            forward = -8
+            single = (pawns >> 8) & empty
+            double = (single >> 8) & empty & WHITE_DOUBLE_PUSH_RANK
+        else:
+            forward = 8
+            single = (pawns << 8) & empty
+            double = (single << 8) & empty & BLACK_DOUBLE_PUSH_RANK
+        if captures_only:  # only pushes that promote
+            single &= PROMOTION_RANKS
+            double = 0
+        elif quiets_only:  # only pushes that don't
+            single &= ~PROMOTION_RANKS
+        pawn = ally_color | PAWN
+        caches = MOVE_CACHES[pawn]
+        for targets, distance in ((single & check_mask, 1), (double & check_mask, 2)):
+            while targets:
+                low = targets & -targets
+                targets ^= low
+                to = low.bit_length() - 1
+                start = to - forward * distance
+                if start not in pins or pins[start] & low:
+                    move = caches[start].get(to << 5)
+                    if move is None:
+                        move = caches[start][to << 5] = fromSquares(SQUARES[start], SQUARES[to], pawn, EMPTY)
+                    moves.append(move)
+        if quiets_only:
+            return
+        # captures towards the a file and towards the h file, all pawns at once
+        if ally_color == WHITE:
+            captures = (((pawns & ~FILE_A) >> 9, -9), ((pawns & ~FILE_H) >> 7, -7))
+        else:
+            captures = (((pawns & ~FILE_A) << 7, 7), ((pawns & ~FILE_H) << 9, 9))
+        squares = self.squares
+        for targets, offset in captures:
+            targets &= enemies & check_mask
+            while targets:
+                low = targets & -targets
+                targets ^= low
+                to = low.bit_length() - 1
+                start = to - offset
+                if start not in pins or pins[start] & low:
+                    captured = squares[SQUARES[to]]
+                    move = caches[start].get(to << 5 | captured)
+                    if move is None:
+                        move = caches[start][to << 5 | captured] = fromSquares(SQUARES[start], SQUARES[to], pawn,
+                                                                                captured)
+                    moves.append(move)
+        if self.enpassantPossible:
+            to = BIT_INDEX[self.enpassantPossible]
+            pieces = PAWN_ATTACKS[opp_color][to] & pawns  # the pawns that attack the square
+            while pieces:
+                low = pieces & -pieces
+                pieces ^= low
+                self.addEnpassantMove(low.bit_length() - 1, to, ally_color, opp_color, occupied, moves)
+
+    def addEnpassantMove(self, start, to, ally_color, opp_color, occupied, moves):
+        # play the capture out on the occupancy and check the king directly, which covers pins, checks
+        # and the pawns leaving the king's rank together
+        captured = to - 8 if ally_color == BLACK else to + 8
+        captured_bit = 1 << captured
+        occupied_after = occupied ^ (1 << start) ^ (1 << to) ^ captured_bit
+        king = BIT_INDEX[self.whiteKingSquare if self.whiteToMove else self.blackKingSquare]
+        self.bitboards[opp_color | PAWN] ^= captured_bit
+        exposed = self.attackersOf(king, opp_color, occupied_after)
+        self.bitboards[opp_color | PAWN] ^= captured_bit
+        if not exposed:
+            moves.append(fromSquares(SQUARES[start], SQUARES[to], ally_color | PAWN, opp_color | PAWN, ENPASSANT_FLAG))
+
+    def addCastleMoves(self, king, opp_color, occupied, moves):
+        king_piece = self.squares[SQUARES[king]]
+        if self.whiteToMove:
+            kingside, queenside = self.currentCastlingRights.wks, self.currentCastlingRights.wqs
+        else:
+            kingside, queenside = self.currentCastlingRights.bks, self.currentCastlingRights.bqs
+        if kingside and not occupied & ((1 << (king + 1)) | (1 << (king + 2))):
+            if not self.attackersOf(king + 1, opp_color, occupied) and \
+                    not self.attackersOf(king + 2, opp_color, occupied):
+                moves.append(fromSquares(SQUARES[king], SQUARES[king + 2], king_piece, EMPTY, CASTLE_FLAG))
+        if queenside and not occupied & ((1 << (king - 1)) | (1 << (king - 2)) | (1 << (king - 3))):
+            if not self.attackersOf(king - 1, opp_color, occupied) and \
+                    not self.attackersOf(king - 2, opp_color, occupied):
+                moves.append(fromSquares(SQUARES[king], SQUARES[king - 2], king_piece, EMPTY, CASTLE_FLAG))
+
+    def setGameOver(self, moves):
+        if len(moves) == 0:
+            self.checkmate = self.in_check
+            self.stalemate = not self.in_check
+        else:
+            self.checkmate = False
+            self.stalemate = False
@@ -1,97 +1,178 @@
 # Stores information about current state of game and also determines the valid moves at the current state
 # and keeps a move log
-import numpy as np
 from Engine import ChessMove
 from Engine import CastleRights
+from Engine import Zobrist
+from Engine import Evaluation
+from Engine.Mailbox import EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, OFFBOARD, TYPE_MASK, WHITE, BLACK, \
+    COLOR_MASK, PIECE_NAMES, ROOK_DIRECTIONS, BISHOP_DIRECTIONS, KING_DIRECTIONS, KNIGHT_OFFSETS, \
+    NW, NE, SW, SE, SQUARES, ROW_COL, A8, H8, A1, H1, emptyMailbox, square
+from Engine.ChessMove import SQUARE_MASK, TO_SHIFT, PROMOTION_SHIFT, PROMOTION_MASK, ENPASSANT_FLAG, CASTLE_FLAG, \
+    fromSquares
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+USE_ATTACK_MAP = False  # answer king-move and castling legality from a per-position map of attacked squares
+
+FEN_PIECES = {'P': WHITE | PAWN, 'N': WHITE | KNIGHT, 'B': WHITE | BISHOP, 'R': WHITE | ROOK, 'Q': WHITE | QUEEN,
+              'K': WHITE | KING, 'p': BLACK | PAWN, 'n': BLACK | KNIGHT, 'b': BLACK | BISHOP, 'r': BLACK | ROOK,
+              'q': BLACK | QUEEN, 'k': BLACK | KING}
 
 
 class GameState:
     def __init__(self):
-        self.board = np.empty([8, 8], dtype='U2')
-        for r in range(8):
-            for c in range(8):
-                if r == 0:
-                    if c == 0 or c == 7:
-                        self.board[r, c] = 'bR'
-                    elif c == 1 or c == 6:
-                        self.board[r, c] = 'bN'
-                    elif c == 2 or c == 5:
-                        self.board[r, c] = 'bB'
-                    elif c == 3:
-                        self.board[r, c] = 'bQ'
-                    else:
-                        self.board[r, c] = 'bK'
-                elif r == 1:
-                    self.board[r, c] = 'bp'
-                elif r == 6:
-                    self.board[r, c] = 'wp'
-                elif r == 7:
-                    if c == 0 or c == 7:
-                        self.board[r, c] = 'wR'
-                    elif c == 1 or c == 6:
-                        self.board[r, c] = 'wN'
-                    elif c == 2 or c == 5:
-                        self.board[r, c] = 'wB'
-                    elif c == 3:
-                        self.board[r, c] = 'wQ'
-                    else:
-                        self.board[r, c] = 'wK'
-                else:
-                    self.board[r, c] = '--'
-        self.moveFunctions = {'p': self.getPawnMoves, 'R': self.getRookMoves, 'N': self.getKnightMoves,
-                              'B': self.getBishopMoves, 'K': self.getKingMoves, 'Q': self.getQueenMoves}
+        # squares is the integer 10x12 mailbox used by move generation (see Mailbox);
+        # board mirrors it as an 8x8 grid of piece names ('wp', '--') for the drawing code and Move
+        self.squares = emptyMailbox()
+        self.board = [['--'] * 8 for _ in range(8)]
+        self.moveFunctions = {PAWN: self.getPawnMoves, ROOK: self.getRookMoves, KNIGHT: self.getKnightMoves,
+                              BISHOP: self.getBishopMoves, KING: self.getKingMoves, QUEEN: self.getQueenMoves}
         self.whiteToMove = True
         self.moveLog = []
-        self.whiteKingLocation = (7, 4)
-        self.blackKingLocation = (0, 4)
+        self.whiteKingSquare = square(7, 4)
+        self.blackKingSquare = square(0, 4)
         self.in_check = False
-        self.pins = []
+        self.pins = {}  # mailbox square of a pinned piece -> direction from the king towards the pinning piece
         self.checks = []
         self.checkmate = False
         self.stalemate = False
-        self.enpassantPossible = ()  # coordinates for the square where en passant is possible
+        self.enpassantPossible = 0  # mailbox square where en passant is possible, 0 if there is none
         self.enpassantPossibleLog = [self.enpassantPossible]
         self.currentCastlingRights = CastleRights.CastleRights(True, True, True, True)
         self.castlingLog = [CastleRights.CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
                                          self.currentCastlingRights.wqs, self.currentCastlingRights.bqs)]
+        self.zobristKey = 0  # 64 bit position key, updated incrementally
+        self.zobristKeyLog = [self.zobristKey]
+        # running material and piece-square totals in centipawns (white positive), see Evaluation
+        self.materialScore = 0
+        self.positionScore = 0
+        self.evaluationLog = [(self.materialScore, self.positionScore)]
+        self.attackMap = None  # cached result of getAttackMap
+        self.legalGenerations = 0  # number of full legal move generations, for search statistics
+        self.attackMapKey = None  # (zobristKey, color) the cached map was built for
+        self.loadFen(START_FEN)
+
+    # sets up the position described by a FEN string, clearing the move log
+    def loadFen(self, fen):
+        fields = fen.split()
+        rows = fields[0].split('/')
+        if len(rows) != 8:
+            raise ValueError("FEN must describe 8 ranks: " + fen)
+        self.startFen = fen  # position the move log starts from
+        self.squares = emptyMailbox()
+        for r in range(8):
+            c = 0
+            for ch in rows[r]:
+                if ch.isdigit():
+                    c += int(ch)
+                else:
+                    if ch not in FEN_PIECES or c > 7:
+                        raise ValueError("invalid FEN rank " + rows[r])
+                    piece = FEN_PIECES[ch]
+                    self.squares[square(r, c)] = piece
+                    if piece == WHITE | KING:
+                        self.whiteKingSquare = square(r, c)
+                    elif piece == BLACK | KING:
+                        self.blackKingSquare = square(r, c)
+                    c += 1
+            if c != 8:
+                raise ValueError("FEN rank " + rows[r] + " does not describe 8 squares")
+        self.board = [[PIECE_NAMES[self.squares[square(r, c)]] for c in range(8)] for r in range(8)]
+        self.whiteToMove = len(fields) < 2 or fields[1] == 'w'
+        castling = fields[2] if len(fields) > 2 else '-'
+        self.currentCastlingRights = CastleRights.CastleRights('K' in castling, 'k' in castling,
+                                                               'Q' in castling, 'q' in castling)
+        self.castlingLog = [CastleRights.CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
+                                                      self.currentCastlingRights.wqs, self.currentCastlingRights.bqs)]
+        enpassant = fields[3] if len(fields) > 3 else '-'
+        if enpassant == '-':
+            self.enpassantPossible = 0
+        else:
+            self.enpassantPossible = square(ChessMove.Move.ranks_to_rows[enpassant[1]],
+                                            ChessMove.Move.files_to_cols[enpassant[0]])
+        self.enpassantPossibleLog = [self.enpassantPossible]
+        self.moveLog = []
+        self.zobristKey = Zobrist.computeKey(self)
+        self.zobristKeyLog = [self.zobristKey]
+        self.materialScore, self.positionScore = Evaluation.computeTotals(self)
+        self.evaluationLog = [(self.materialScore, self.positionScore)]
+        self.in_check = False
+        self.pins = {}
+        self.checks = []
+        self.checkmate = False
+        self.stalemate = False
 
     # takes a Move object and executes it
     def makeMove(self, move):
-        self.board[move.endRow][move.endCol] = move.pieceMoved
-        self.board[move.startRow][move.startCol] = '--'
-        if move.pieceMoved == 'wK':
-            self.whiteKingLocation = (move.endRow, move.endCol)
-        elif move.pieceMoved == 'bK':
-            self.blackKingLocation = (move.endRow, move.endCol)
+        squares = self.squares
+        piece_keys = Zobrist.PIECE_KEYS
+        piece_square_values = Evaluation.PIECE_SQUARE_VALUES
+        code = move.code
+        start = code & SQUARE_MASK
+        end = code >> TO_SHIFT & SQUARE_MASK
+        moved = squares[start]
+        captured = squares[end]
+        key = self.zobristKey ^ piece_keys[moved][start]
+        key ^= Zobrist.enpassantKey(self.enpassantPossible, squares) ^ Zobrist.castlingKey(self.currentCastlingRights)
+        position = self.positionScore - piece_square_values[moved][start]
+        material = self.materialScore
+        if captured != EMPTY:
+            key ^= piece_keys[captured][end]
+            material -= Evaluation.MATERIAL_VALUES[captured]
+            position -= piece_square_values[captured][end]
+        placed = moved
         # pawn promotion
-        if move.isPawnPromotion:
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + 'Q'  # TODO change to promotion choice once promotion choice implemented
+        if code & PROMOTION_MASK:
+            placed = (moved & COLOR_MASK) | code >> PROMOTION_SHIFT & TYPE_MASK
+            material += Evaluation.MATERIAL_VALUES[placed] - Evaluation.MATERIAL_VALUES[moved]
+        position += piece_square_values[placed][end]
+        squares[start] = EMPTY
+        squares[end] = placed
+        start_row, start_col = ROW_COL[start]
+        end_row, end_col = ROW_COL[end]
+        self.board[start_row][start_col] = '--'
+        self.board[end_row][end_col] = PIECE_NAMES[placed]
+        key ^= piece_keys[placed][end]
+        if moved == WHITE | KING:
+            self.whiteKingSquare = end
+        elif moved == BLACK | KING:
+            self.blackKingSquare = end
         # en passant
-        if move.isEnpassantMove:
-            self.board[move.endRow][move.endCol] = move.pieceMoved  # capturing the pawn
-            if self.whiteToMove:
-                self.board[move.endRow + 1][move.endCol] = '--'
-            else:
-                self.board[move.endRow - 1][move.endCol] = '--'
+        if code & ENPASSANT_FLAG:
+            captured_square = end + 10 if self.whiteToMove else end - 10  # the captured pawn is behind the end square
+            captured = squares[captured_square]
+            key ^= piece_keys[captured][captured_square]
+            material -= Evaluation.MATERIAL_VALUES[captured]
+            position -= piece_square_values[captured][captured_square]
+            squares[captured_square] = EMPTY
+            self.board[start_row][end_col] = '--'
         # update enpassantPossible
-        if move.pieceMoved[1] == 'p' and abs(move.startRow - move.endRow) == 2:
-            self.enpassantPossible = ((move.startRow + move.endRow) // 2, (move.startCol + move.endCol) // 2)
+        if moved & TYPE_MASK == PAWN and abs(start - end) == 20:
+            self.enpassantPossible = (start + end) // 2
         else:
-            self.enpassantPossible = ()
+            self.enpassantPossible = 0
         # castle move
-        if move.is_castle_move:
-            if move.endCol - move.startCol == 2:  # king-side castle move
-                self.board[move.endRow][move.endCol - 1] = self.board[move.endRow][
-                    move.endCol + 1]  # moves the rook to its new square
-                self.board[move.endRow][move.endCol + 1] = '--'  # erase old rook
+        if code & CASTLE_FLAG:
+            if end - start == 2:  # king-side castle move
+                rook_from, rook_to = end + 1, end - 1
             else:  # queen-side castle move
-                self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][
-                    move.endCol - 2]  # moves the rook to its new square
-                self.board[move.endRow][move.endCol - 2] = '--'  # erase old rook
+                rook_from, rook_to = end - 2, end + 1
+            rook = squares[rook_from]
+            squares[rook_to] = rook  # moves the rook to its new square
+            squares[rook_from] = EMPTY  # erase old rook
+            self.board[end_row][ROW_COL[rook_to][1]] = PIECE_NAMES[rook]
+            self.board[end_row][ROW_COL[rook_from][1]] = '--'
+            key ^= piece_keys[rook][rook_from] ^ piece_keys[rook][rook_to]
+            position += piece_square_values[rook][rook_to] - piece_square_values[rook][rook_from]
+        self.materialScore = material
+        self.positionScore = position
+        self.evaluationLog.append((material, position))
         # update castling rights
         self.updateCastleRights(move)
-        self.castlingLog.append(CastleRights.CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
-                                             self.currentCastlingRights.wqs, self.currentCastlingRights.bqs))
+        key ^= Zobrist.enpassantKey(self.enpassantPossible, squares) ^ Zobrist.castlingKey(self.currentCastlingRights)
+        self.zobristKey = key ^ Zobrist.SIDE_KEY
+        self.zobristKeyLog.append(self.zobristKey)
+        rights = self.currentCastlingRights
+        self.castlingLog.append(CastleRights.CastleRights(rights.wks, rights.bks, rights.wqs, rights.bqs))
         self.enpassantPossibleLog.append(self.enpassantPossible)
         self.moveLog.append(move)
         self.whiteToMove = not self.whiteToMove
@@ -100,111 +181,161 @@ class GameState:
     def undoMove(self):
         if len(self.moveLog) != 0:
             move = self.moveLog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
+            squares = self.squares
+            code = move.code
+            start = code & SQUARE_MASK
+            end = code >> TO_SHIFT & SQUARE_MASK
+            start_row, start_col = ROW_COL[start]
+            end_row, end_col = ROW_COL[end]
+            moved = move.moved
+            captured = move.captured
+            squares[start] = moved
+            self.board[start_row][start_col] = PIECE_NAMES[moved]
             self.whiteToMove = not self.whiteToMove
-            if move.pieceMoved == 'wK':
-                self.whiteKingLocation = (move.endRow, move.endCol)
-            elif move.pieceMoved == 'bK':
-                self.blackKingLocation = (move.endRow, move.endCol)
+            if moved == WHITE | KING:
+                self.whiteKingSquare = start
+            elif moved == BLACK | KING:
+                self.blackKingSquare = start
             # undo enpassant
-            if move.isEnpassantMove:
-                self.board[move.endRow][move.endCol] = '--'
-                self.board[move.startRow][move.endCol] = move.pieceCaptured
+            if code & ENPASSANT_FLAG:
+                squares[end] = EMPTY
+                self.board[end_row][end_col] = '--'
+                captured_square = end + 10 if self.whiteToMove else end - 10
+                squares[captured_square] = captured
+                self.board[start_row][end_col] = PIECE_NAMES[captured]
+            else:
+                squares[end] = captured
+                self.board[end_row][end_col] = PIECE_NAMES[captured]
             self.enpassantPossibleLog.pop()
             self.enpassantPossible = self.enpassantPossibleLog[-1]
             self.checkmate = False
             self.stalemate = False
             # undo castle move
-            if move.is_castle_move:
-                if move.endCol - move.startCol == 2:  # king-side
-                    self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][move.endCol - 1]
-                    self.board[move.endRow][move.endCol - 1] = '--'
+            if code & CASTLE_FLAG:
+                if end - start == 2:  # king-side
+                    rook_from, rook_to = end + 1, end - 1
                 else:  # queen-side
-                    self.board[move.endRow][move.endCol - 2] = self.board[move.endRow][move.endCol + 1]
-                    self.board[move.endRow][move.endCol + 1] = '--'
+                    rook_from, rook_to = end - 2, end + 1
+                rook = squares[rook_to]
+                squares[rook_from] = rook
+                squares[rook_to] = EMPTY
+                self.board[end_row][ROW_COL[rook_from][1]] = PIECE_NAMES[rook]
+                self.board[end_row][ROW_COL[rook_to][1]] = '--'
+            self.zobristKeyLog.pop()
+            self.zobristKey = self.zobristKeyLog[-1]
+            self.evaluationLog.pop()
+            self.materialScore, self.positionScore = self.evaluationLog[-1]
             # undo castling rights
             self.castlingLog.pop()
-            self.currentCastlingRights = self.castlingLog[-1]
+            last_rights = self.castlingLog[-1]
+            # copy so that later updates don't modify the logged rights
+            self.currentCastlingRights = CastleRights.CastleRights(last_rights.wks, last_rights.bks,
+                                                                   last_rights.wqs, last_rights.bqs)
+
+    def makeNullMove(self):
+        """
+        Passes the turn, for null-move pruning: only the side to move and the en passant square change.
+        The move log gets None as the move; take it back with undoNullMove, not undoMove.
+        """
+        self.zobristKey ^= Zobrist.enpassantKey(self.enpassantPossible, self.squares) ^ Zobrist.SIDE_KEY
+        self.zobristKeyLog.append(self.zobristKey)
+        self.enpassantPossible = 0
+        self.enpassantPossibleLog.append(0)
+        self.evaluationLog.append((self.materialScore, self.positionScore))
+        self.castlingLog.append(self.castlingLog[-1])  # logged rights are never modified, so sharing them is safe
+        self.moveLog.append(None)
+        self.whiteToMove = not self.whiteToMove
+
+    def undoNullMove(self):
+        self.moveLog.pop()
+        self.whiteToMove = not self.whiteToMove
+        self.zobristKeyLog.pop()
+        self.zobristKey = self.zobristKeyLog[-1]
+        self.enpassantPossibleLog.pop()
+        self.enpassantPossible = self.enpassantPossibleLog[-1]
+        self.evaluationLog.pop()
+        self.castlingLog.pop()
+        self.checkmate = False
+        self.stalemate = False
+
+    def hasNonPawnMaterial(self):
+        """
+        Whether the side to move has a piece other than pawns and the king. Without one, zugzwang is common and a
+        null move is no safe guess of the worst the side can do.
+        """
+        color = WHITE if self.whiteToMove else BLACK
+        squares = self.squares
+        for s in SQUARES:
+            piece = squares[s]
+            if piece & COLOR_MASK == color and KNIGHT <= piece & TYPE_MASK <= QUEEN:
+                return True
+        return False
 
     def updateCastleRights(self, move):
-        if move.pieceMoved == 'wK':
+        moved = move.moved
+        if moved == WHITE | KING:
             self.currentCastlingRights.wks = False
             self.currentCastlingRights.wqs = False
-        elif move.pieceMoved == 'bK':
+        elif moved == BLACK | KING:
             self.currentCastlingRights.bks = False
             self.currentCastlingRights.bqs = False
-        elif move.pieceMoved == 'wR':
-            if move.startRow == 7:
-                if move.startCol == 0:  # left rook
-                    self.currentCastlingRights.wqs = False
-                elif move.startCol == 7:  # right rook
-                    self.currentCastlingRights.wks = False
-        elif move.pieceMoved == 'bR':
-            if move.startRow == 0:
-                if move.startCol == 0:  # left rook
-                    self.currentCastlingRights.bqs = False
-                elif move.startCol == 7:  # right rook
-                    self.currentCastlingRights.bks = False
-        if move.pieceCaptured == 'wR':
-            if move.endRow == 7:
-                if move.endCol == 0:
-                    self.currentCastlingRights.wqs = False
-                elif move.endCol == 7:
-                    self.currentCastlingRights.wks = False
-        elif move.pieceCaptured == 'bR':
-            if move.endRow == 0:
-                if move.endCol == 0:
-                    self.currentCastlingRights.bqs = False
-                elif move.endCol == 7:
-                    self.currentCastlingRights.bks = False
-
+        elif moved == WHITE | ROOK:
+            start = move.code & SQUARE_MASK
+            if start == A1:  # left rook
+                self.currentCastlingRights.wqs = False
+            elif start == H1:  # right rook
+                self.currentCastlingRights.wks = False
+        elif moved == BLACK | ROOK:
+            start = move.code & SQUARE_MASK
+            if start == A8:  # left rook
+                self.currentCastlingRights.bqs = False
+            elif start == H8:  # right rook
+                self.currentCastlingRights.bks = False
+        if move.captured & TYPE_MASK == ROOK:
+            end = move.code >> TO_SHIFT & SQUARE_MASK
+            if end == A1:
+                self.currentCastlingRights.wqs = False
+            elif end == H1:
+                self.currentCastlingRights.wks = False
+            elif end == A8:
+                self.currentCastlingRights.bqs = False
+            elif end == H8:
+                self.currentCastlingRights.bks = False
 
     # generates all valid moves out of all possible moves
     def getValidMoves(self):
+        self.legalGenerations += 1
         moves = []
         temp_castle_rights = CastleRights.CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
                                           self.currentCastlingRights.wqs, self.currentCastlingRights.bqs)
         self.in_check, self.pins, self.checks = self.checkForPinsAndChecks()
-        if self.whiteToMove:
-            kingRow = self.whiteKingLocation[0]
-            kingCol = self.whiteKingLocation[1]
-        else:
-            kingRow = self.blackKingLocation[0]
-            kingCol = self.blackKingLocation[1]
+        king_square = self.whiteKingSquare if self.whiteToMove else self.blackKingSquare
         if self.in_check:
-            if len(self.checks) == 1:  # king attacked only by one piece, check should be blocked, or king should be moved
+            # king attacked only by one piece, check should be blocked, or king should be moved
+            if len(self.checks) == 1:
                 moves = self.getAllMoves()
-                check = self.checks[0]
-                checkRow = check[0]
-                checkCol = check[1]
-                pieceChecking = self.board[checkRow][checkCol]
-                validSquares = []
+                check_square, check_direction = self.checks[0]
                 # if the piece causing a check is a knight, it must be captured or the king must be moved
-                if pieceChecking[1] == 'N':
-                    validSquares = [(checkRow, checkCol)]
+                if self.squares[check_square] & TYPE_MASK == KNIGHT:
+                    valid_squares = {check_square}
                 else:
-                    for i in range(1, 8):
-                        validSquare = (kingRow + check[2] * i, kingCol + check[3] * i)  # check[2/3] are the check directions
-                        validSquares.append(validSquare)
-                        if validSquare[0] == checkRow and validSquare[1] == checkCol:
-                            break
+                    valid_squares = set()
+                    s = king_square
+                    while s != check_square:
+                        s += check_direction
+                        valid_squares.add(s)
+                # en passant removes a checking pawn from behind its end square
+                enpassant_capture_offset = 10 if self.whiteToMove else -10
                 # get rid of any moves that don't block check or move king
-                for i in range(len(moves) - 1, -1, -1):  # go backwards through list
-                    if moves[i].pieceMoved[1] != 'K':  # king not moved so the check causing piece must be blocked or captured
-                        if not (moves[i].endRow,
-                                moves[i].endCol) in validSquares:  # move doesnt block check or capture piece
-                            moves.remove(moves[i])
+                moves = [m for m in moves if m.startSq == king_square or m.endSq in valid_squares or
+                         (m.isEnpassantMove and m.endSq + enpassant_capture_offset == check_square)]
             else:  # double check, king must move
-                self.getKingMoves(kingRow, kingCol, moves)
+                self.getKingMoves(king_square, moves)
         else:  # not in check
             moves = self.getAllMoves()
-            if self.whiteToMove:
-                self.getCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
-            else:
-                self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
+            self.getCastleMoves(king_square, moves)
         if len(moves) == 0:
-            if self.inCheck():
+            if self.in_check:
                 self.checkmate = True
             else:
                 # TODO stalemate on repeated moves
@@ -216,292 +347,346 @@ class GameState:
         self.currentCastlingRights = temp_castle_rights
         return moves
 
+    # returns the legal move with the given moveID, or None if there is none, generating only the moves of the piece
+    # on its start square. Castling moves are not found, and neither is any move while in check
+    def getMoveByID(self, move_id):
+        if move_id is None or move_id < 0:
+            return None
+        start = move_id & SQUARE_MASK
+        piece = self.squares[start] if start < 120 else EMPTY
+        if not piece & (WHITE if self.whiteToMove else BLACK):
+            return None
+        self.in_check, self.pins, self.checks = self.checkForPinsAndChecks()
+        if self.in_check:
+            return None
+        moves = []
+        self.moveFunctions[piece & TYPE_MASK](start, moves)
+        for move in moves:
+            if move.moveID == move_id:
+                return move
+        return None
+
+    # whether the side to move has any legal move, stopping at the first one found instead of generating them all
+    def hasLegalMove(self):
+        self.in_check, self.pins, self.checks = self.checkForPinsAndChecks()
+        if self.in_check:
+            return len(self.getValidMoves()) > 0  # evasions are few, and need the full check filtering
+        squares = self.squares
+        moves = []
+        king_square = self.whiteKingSquare if self.whiteToMove else self.blackKingSquare
+        self.getKingMoves(king_square, moves)
+        if moves:
+            return True
+        ally_color = WHITE if self.whiteToMove else BLACK
+        for s in SQUARES:
+            piece = squares[s]
+            if piece & ally_color and s != king_square:
+                self.moveFunctions[piece & TYPE_MASK](s, moves)
+                if moves:
+                    return True
+        return False
+
     def inCheck(self):
         if self.whiteToMove:
-            return self.squareUnderAttack(self.whiteKingLocation[0], self.whiteKingLocation[1])
+            return self.squareUnderAttack(self.whiteKingSquare)
         else:
-            return self.squareUnderAttack(self.blackKingLocation[0], self.blackKingLocation[1])
+            return self.squareUnderAttack(self.blackKingSquare)
 
-    def squareUnderAttack(self, r, c):
-        self.whiteToMove = not self.whiteToMove  # switch to opponent's point of view
-        opponents_moves = self.getAllMoves()
-        self.whiteToMove = not self.whiteToMove
-        for move in opponents_moves:
-            if move.endRow == r and move.endCol == c:  # square is under attack
+    # whether the opponent of the side to move attacks square s
+    def squareUnderAttack(self, s):
+        if USE_ATTACK_MAP:
+            return self.getAttackMap(BLACK if self.whiteToMove else WHITE)[s]
+        return self.squareAttackedBy(s, BLACK if self.whiteToMove else WHITE)
+
+    # whether a piece of by_color attacks square s, found by looking outwards from s: along the rays for sliders,
+    # and at the knight, king and pawn offsets, instead of generating the attacking side's moves
+    def squareAttackedBy(self, s, by_color):
+        squares = self.squares
+        pawn = by_color | PAWN
+        if by_color == WHITE:  # white pawns attack upwards, so they sit below the square
+            if squares[s + SW] == pawn or squares[s + SE] == pawn:
+                return True
+        elif squares[s + NW] == pawn or squares[s + NE] == pawn:
+            return True
+        knight = by_color | KNIGHT
+        for offset in KNIGHT_OFFSETS:
+            if squares[s + offset] == knight:
+                return True
+        king = by_color | KING
+        queen = by_color | QUEEN
+        rook = by_color | ROOK
+        for d in ROOK_DIRECTIONS:
+            end = s + d
+            piece = squares[end]
+            if piece == king:
+                return True
+            while piece == EMPTY:
+                end += d
+                piece = squares[end]
+            if piece == rook or piece == queen:
+                return True
+        bishop = by_color | BISHOP
+        for d in BISHOP_DIRECTIONS:
+            end = s + d
+            piece = squares[end]
+            if piece == king:
+                return True
+            while piece == EMPTY:
+                end += d
+                piece = squares[end]
+            if piece == bishop or piece == queen:
                 return True
         return False
 
+    # returns a list of 120 flags telling which squares by_color attacks. Sliders see through the other side's king,
+    # so the map also answers whether that king may step back along a checking line. Cached for the last position
+    def getAttackMap(self, by_color):
+        if self.attackMapKey == (self.zobristKey, by_color):
+            return self.attackMap
+        attacked = [False] * 120
+        squares = self.squares
+        transparent_king = (WHITE if by_color == BLACK else BLACK) | KING
+        for s in SQUARES:
+            piece = squares[s]
+            if not piece & by_color:
+                continue
+            piece_type = piece & TYPE_MASK
+            if piece_type == PAWN:
+                if by_color == WHITE:
+                    attacked[s + NW] = attacked[s + NE] = True
+                else:
+                    attacked[s + SW] = attacked[s + SE] = True
+            elif piece_type == KNIGHT:
+                for offset in KNIGHT_OFFSETS:
+                    attacked[s + offset] = True
+            elif piece_type == KING:
+                for d in KING_DIRECTIONS:
+                    attacked[s + d] = True
+            else:
+                if piece_type == ROOK:
+                    directions = ROOK_DIRECTIONS
+                elif piece_type == BISHOP:
+                    directions = BISHOP_DIRECTIONS
+                else:
+                    directions = KING_DIRECTIONS
+                for d in directions:
+                    end = s + d
+                    while True:
+                        attacked[end] = True
+                        piece = squares[end]
+                        if piece != EMPTY and piece != transparent_king:
+                            break
+                        end += d
+        self.attackMap = attacked
+        self.attackMapKey = (self.zobristKey, by_color)
+        return attacked
+
     # generates all possible moves
-    def getAllMoves(self):
+    def getAllMoves(self, captures_only=False, quiets_only=False):
         moves = []
-        for r in range(len(self.board)):
-            for c in range(len(self.board[r])):
-                turn = self.board[r][c][0]
-                if (turn == 'w' and self.whiteToMove) or (turn == 'b' and not self.whiteToMove):
-                    piece = self.board[r][c][1]
-                    self.moveFunctions[piece](r, c, moves)
+        squares = self.squares
+        ally_color = WHITE if self.whiteToMove else BLACK
+        for s in SQUARES:
+            piece = squares[s]
+            if piece & ally_color:
+                self.moveFunctions[piece & TYPE_MASK](s, moves, captures_only, quiets_only)
         return moves
 
-    def getPawnMoves(self, r, c, moves):
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+    # generates the legal captures and promotions for quiescence search, or every legal move when in check
+    def getCaptureMoves(self):
+        self.in_check, self.pins, self.checks = self.checkForPinsAndChecks()
+        if self.in_check:
+            return self.getValidMoves()
+        return self.getAllMoves(captures_only=True)
 
+    # generates the legal moves that are neither captures nor promotions, castling included, the moves
+    # getCaptureMoves leaves out. Only for a side that is not in check
+    def getQuietMoves(self):
+        self.in_check, self.pins, self.checks = self.checkForPinsAndChecks()
+        moves = self.getAllMoves(quiets_only=True)
+        self.getCastleMoves(self.whiteKingSquare if self.whiteToMove else self.blackKingSquare, moves)
+        return moves
+
+    # captures_only limits the generators to captures and promotions, quiets_only to the other moves
+    def getPawnMoves(self, s, moves, captures_only=False, quiets_only=False):
+        pin_direction = self.pins.get(s, 0)
+        squares = self.squares
+        pawn = squares[s]
         if self.whiteToMove:
-            move_amount = -1
-            start_row = 6
-            enemy_color = "b"
-            king_row, king_col = self.whiteKingLocation
+            move_amount = -10
+            start_row = 8  # s // 10 for squares on the 2nd rank
+            enemy_color = BLACK
+            king_square = self.whiteKingSquare
         else:
-            move_amount = 1
-            start_row = 1
-            enemy_color = "w"
-            king_row, king_col = self.blackKingLocation
-
-        if self.board[r + move_amount][c] == "--":  # 1 square pawn advance
-            if not piece_pinned or pin_direction == (move_amount, 0):
-                moves.append(ChessMove.Move((r, c), (r + move_amount, c), self.board))
-                if r == start_row and self.board[r + 2 * move_amount][c] == "--":  # 2 square pawn advance
-                    moves.append(ChessMove.Move((r, c), (r + 2 * move_amount, c), self.board))
-        if c - 1 >= 0:  # capture to the left
-            if not piece_pinned or pin_direction == (move_amount, -1):
-                if self.board[r + move_amount][c - 1][0] == enemy_color:
-                    moves.append(ChessMove.Move((r, c), (r + move_amount, c - 1), self.board))
-                if (r + move_amount, c - 1) == self.enpassantPossible:
-                    attacking_piece = blocking_piece = False
-                    if king_row == r:
-                        if king_col < c:  # king is left of the pawn
-                            # inside: between king and the pawn;
-                            # outside: between pawn and border;
-                            inside_range = range(king_col + 1, c - 1)
-                            outside_range = range(c + 1, 8)
-                        else:  # king right of the pawn
-                            inside_range = range(king_col - 1, c, -1)
-                            outside_range = range(c - 2, -1, -1)
-                        for i in inside_range:
-                            if self.board[r][i] != "--":  # some piece beside en-passant pawn blocks
-                                blocking_piece = True
-                        for i in outside_range:
-                            square = self.board[r][i]
-                            if square[0] == enemy_color and (square[1] == "R" or square[1] == "Q"):
-                                attacking_piece = True
-                            elif square != "--":
-                                blocking_piece = True
-                    if not attacking_piece or blocking_piece:
-                        moves.append(ChessMove.Move((r, c), (r + move_amount, c - 1), self.board, is_enpassant_move=True))
-        if c + 1 <= 7:  # capture to the right
-            if not piece_pinned or pin_direction == (move_amount, +1):
-                if self.board[r + move_amount][c + 1][0] == enemy_color:
-                    moves.append(ChessMove.Move((r, c), (r + move_amount, c+ 1), self.board))
-                if (r + move_amount, c + 1) == self.enpassantPossible:
-                    attacking_piece = blocking_piece = False
-                    if king_row == r:
-                        if king_col < c:  # king is left of the pawn
-                            # inside: between king and the pawn;
-                            # outside: between pawn and border;
-                            inside_range = range(king_col + 1, c)
-                            outside_range = range(c + 2, 8)
-                        else:  # king right of the pawn
-                            inside_range = range(king_col - 1, c + 1, -1)
-                            outside_range = range(c - 1, -1, -1)
-                        for i in inside_range:
-                            if self.board[r][i] != "--":  # some piece beside en-passant pawn blocks
-                                blocking_piece = True
-                        for i in outside_range:
-                            square = self.board[r][i]
-                            if square[0] == enemy_color and (square[1] == "R" or square[1] == "Q"):
-                                attacking_piece = True
-                            elif square != "--":
-                                blocking_piece = True
-                    if not attacking_piece or blocking_piece:
-                        moves.append(ChessMove.Move((r, c), (r + move_amount, c + 1), self.board, is_enpassant_move=True))
-
-    def getRookMoves(self, r, c, moves):
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                if self.board[r][c][1] != 'Q':
-                    self.pins.remove(self.pins[i])
-                break
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))
-        opp_color = 'b' if self.whiteToMove else 'w'
+            move_amount = 10
+            start_row = 3
+            enemy_color = WHITE
+            king_square = self.blackKingSquare
+
+        end = s + move_amount
+        promotes = squares[end + move_amount] == OFFBOARD
+        # 1 square pawn advance
+        if squares[end] == EMPTY and (promotes or not captures_only) and not (promotes and quiets_only):
+            if not pin_direction or pin_direction == move_amount or pin_direction == -move_amount:
+                moves.append(fromSquares(s, end, pawn, EMPTY))
+                # 2 square pawn advance
+                if s // 10 == start_row and squares[end + move_amount] == EMPTY and not captures_only:
+                    moves.append(fromSquares(s, end + move_amount, pawn, EMPTY))
+        if quiets_only:
+            return
+        for side in (-1, 1):  # capture to the left and to the right
+            capture_direction = move_amount + side
+            if pin_direction and pin_direction != capture_direction and pin_direction != -capture_direction:
+                continue
+            end = s + capture_direction
+            if squares[end] & enemy_color:
+                moves.append(fromSquares(s, end, pawn, squares[end]))
+            elif end == self.enpassantPossible:
+                # both pawns leave the rank, check that this doesn't expose the king to a rook or queen on it
+                exposes_king = False
+                if king_square // 10 == s // 10:
+                    captured_square = s + side
+                    step = 1 if king_square < s else -1
+                    i = king_square + step
+                    while True:
+                        piece = squares[i]
+                        if i == s or i == captured_square or piece == EMPTY:
+                            i += step
+                            continue
+                        if piece & enemy_color and (piece & TYPE_MASK == ROOK or piece & TYPE_MASK == QUEEN):
+                            exposes_king = True
+                        break
+                if not exposes_king:
+                    moves.append(fromSquares(s, end, pawn, enemy_color | PAWN, ENPASSANT_FLAG))
+
+    def getSlidingMoves(self, s, directions, moves, captures_only=False, quiets_only=False):
+        pin_direction = self.pins.get(s, 0)
+        squares = self.squares
+        piece = squares[s]
+        opp_color = BLACK if self.whiteToMove else WHITE
         for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    if not piece_pinned or pin_direction == d or pin_direction == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == '--':
-                            moves.append(ChessMove.Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == opp_color:
-                            moves.append(ChessMove.Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:  # friendly piece
-                            break
-                else:  # out of bounds
+            if pin_direction and pin_direction != d and pin_direction != -d:
+                continue  # a pinned piece may only move along the pin
+            end = s + d
+            while True:
+                end_piece = squares[end]
+                if end_piece == EMPTY:
+                    if not captures_only:
+                        moves.append(fromSquares(s, end, piece, EMPTY))
+                elif end_piece & opp_color:
+                    if not quiets_only:
+                        moves.append(fromSquares(s, end, piece, end_piece))
                     break
-
-    def getKnightMoves(self, r, c, moves):
-        piece_pinned = False
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piece_pinned = True
-                self.pins.remove(self.pins[i])
-                break
-        knight_moves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, 1), (2, -1))
-        ally_color = 'w' if self.whiteToMove else 'b'
-        for m in knight_moves:
-            endRow = r + m[0]
-            endCol = c + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                if not piece_pinned:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] != ally_color:
-                        moves.append(ChessMove.Move((r, c), (endRow, endCol), self.board))
-
-    def getBishopMoves(self, r, c, moves):
-        # Get all the bishop moves for the bishop located at row col and add the moves to the list.
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
-
-        directions = ((-1, -1), (-1, 1), (1, 1), (1, -1))  # diagonals: up/left up/right down/right down/left
-        opp_color = "b" if self.whiteToMove else "w"
-        for direction in directions:
-            for i in range(1, 8):
-                end_row = r + direction[0] * i
-                end_col = c + direction[1] * i
-                if 0 <= end_row <= 7 and 0 <= end_col <= 7:  # check if the move is on board
-                    if not piece_pinned or pin_direction == direction or pin_direction == (
-                            -direction[0], -direction[1]):
-                        end_piece = self.board[end_row][end_col]
-                        if end_piece == "--":  # empty space is valid
-                            moves.append(ChessMove.Move((r, c), (end_row, end_col), self.board))
-                        elif end_piece[0] == opp_color:  # capture enemy piece
-                            moves.append(ChessMove.Move((r, c), (end_row, end_col), self.board))
-                            break
-                        else:  # friendly piece
-                            break
-                else:  # off board
+                else:  # friendly piece or off board
                     break
+                end += d
 
-    def getKingMoves(self, r, c, moves):
-        row_moves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        col_moves = (-1, 0, 1, -1, 1, -1, 0, 1)
-        ally_color = "w" if self.whiteToMove else "b"
-        for i in range(8):
-            end_row = r + row_moves[i]
-            end_col = c + col_moves[i]
-            if 0 <= end_row <= 7 and 0 <= end_col <= 7:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally_color:  # not an ally piece - empty or enemy
-                    # place king on end square and check for checks
-                    if ally_color == "w":
-                        self.whiteKingLocation = (end_row, end_col)
-                    else:
-                        self.blackKingLocation = (end_row, end_col)
-                    in_check, pins, checks = self.checkForPinsAndChecks()
-                    if not in_check:
-                        moves.append(ChessMove.Move((r, c), (end_row, end_col), self.board))
-                    # place king back on original location
-                    if ally_color == "w":
-                        self.whiteKingLocation = (r, c)
-                    else:
-                        self.blackKingLocation = (r, c)
-
-    def getCastleMoves(self, r, c, moves):
-        if self.squareUnderAttack(r, c):
+    def getRookMoves(self, s, moves, captures_only=False, quiets_only=False):
+        self.getSlidingMoves(s, ROOK_DIRECTIONS, moves, captures_only, quiets_only)
+
+    def getKnightMoves(self, s, moves, captures_only=False, quiets_only=False):
+        if s in self.pins:  # a pinned knight can never move
+            return
+        squares = self.squares
+        knight = squares[s]
+        opp_color = BLACK if self.whiteToMove else WHITE
+        for offset in KNIGHT_OFFSETS:
+            end_piece = squares[s + offset]
+            if (end_piece & opp_color and not quiets_only) or (end_piece == EMPTY and not captures_only):
+                moves.append(fromSquares(s, s + offset, knight, end_piece))
+
+    def getBishopMoves(self, s, moves, captures_only=False, quiets_only=False):
+        self.getSlidingMoves(s, BISHOP_DIRECTIONS, moves, captures_only, quiets_only)
+
+    def getKingMoves(self, s, moves, captures_only=False, quiets_only=False):
+        squares = self.squares
+        king = squares[s]
+        opp_color = BLACK if self.whiteToMove else WHITE
+        squares[s] = EMPTY  # lift the king so it can't shelter behind itself on a slider's line
+        for d in KING_DIRECTIONS:
+            end = s + d
+            end_piece = squares[end]
+            if (end_piece & opp_color and not quiets_only) or (end_piece == EMPTY and not captures_only):
+                if not self.squareUnderAttack(end):
+                    moves.append(fromSquares(s, end, king, end_piece))
+        squares[s] = king
+
+    def getCastleMoves(self, s, moves):
+        if self.squareUnderAttack(s):
             return
         if (self.whiteToMove and self.currentCastlingRights.wks) or (
                 not self.whiteToMove and self.currentCastlingRights.bks):
-            self.getKingsideCastleMoves(r, c, moves)
+            self.getKingsideCastleMoves(s, moves)
         if (self.whiteToMove and self.currentCastlingRights.wqs) or (
                 not self.whiteToMove and self.currentCastlingRights.bqs):
-            self.getQueensideCastleMoves(r, c, moves)
+            self.getQueensideCastleMoves(s, moves)
 
-    def getKingsideCastleMoves(self, r, c, moves):
-        if self.board[r][c + 1] == '--' and self.board[r][c + 2] == '--':
-            if not self.squareUnderAttack(r, c + 1) and not self.squareUnderAttack(r, c + 2):
-                moves.append(ChessMove.Move((r, c), (r, c + 2), self.board, is_castle_move=True))
+    def getKingsideCastleMoves(self, s, moves):
+        if self.squares[s + 1] == EMPTY and self.squares[s + 2] == EMPTY:
+            if not self.squareUnderAttack(s + 1) and not self.squareUnderAttack(s + 2):
+                moves.append(fromSquares(s, s + 2, self.squares[s], EMPTY, CASTLE_FLAG))
 
-    def getQueensideCastleMoves(self, r, c, moves):
-        if self.board[r][c - 1] == '--' and self.board[r][c - 2] == '--' and self.board[r][c - 3] == '--':
-            if not self.squareUnderAttack(r, c - 1) and not self.squareUnderAttack(r, c - 2):
-                moves.append(ChessMove.Move((r, c), (r, c - 2), self.board, is_castle_move=True))
+    def getQueensideCastleMoves(self, s, moves):
+        if self.squares[s - 1] == EMPTY and self.squares[s - 2] == EMPTY and self.squares[s - 3] == EMPTY:
+            if not self.squareUnderAttack(s - 1) and not self.squareUnderAttack(s - 2):
+                moves.append(fromSquares(s, s - 2, self.squares[s], EMPTY, CASTLE_FLAG))
 
-    def getQueenMoves(self, r, c, moves):
-        self.getRookMoves(r, c, moves)
-        self.getBishopMoves(r, c, moves)
+    def getQueenMoves(self, s, moves, captures_only=False, quiets_only=False):
+        self.getSlidingMoves(s, KING_DIRECTIONS, moves, captures_only, quiets_only)
 
-    # returns list of all the pieces that are pinned, all the pieces that are causing a check and whether or not the king is in check
+    # returns whether or not the king is in check, the pieces that are pinned (as a dict of square -> pin direction)
+    # and the pieces that are causing a check (as (square, direction from the king) tuples)
     def checkForPinsAndChecks(self):
-        pins = []
+        pins = {}
         checks = []
         in_check = False
+        squares = self.squares
         if self.whiteToMove:
-            opp_color = 'b'
-            ally_color = 'w'
-            startRow = self.whiteKingLocation[0]
-            startCol = self.whiteKingLocation[1]
+            opp_color = BLACK
+            ally_color = WHITE
+            start = self.whiteKingSquare
+            pawn_directions = (NW, NE)  # black pawns check the white king from above
         else:
-            opp_color = 'w'
-            ally_color = 'b'
-            startRow = self.blackKingLocation[0]
-            startCol = self.blackKingLocation[1]
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            d = directions[j]
-            possiblePin = ()
-            for i in range(1, 8):
-                endRow = startRow + d[0] * i
-                endCol = startCol + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] == ally_color and endPiece[1] != 'K':
-                        if possiblePin == ():
-                            possiblePin = (endRow, endCol, d[0], d[1])
+            opp_color = WHITE
+            ally_color = BLACK
+            start = self.blackKingSquare
+            pawn_directions = (SW, SE)
+        for j in range(len(KING_DIRECTIONS)):
+            d = KING_DIRECTIONS[j]
+            possible_pin = 0
+            end = start + d
+            distance = 1
+            while True:
+                end_piece = squares[end]
+                if end_piece & ally_color:
+                    # the king itself is skipped: it may be on this ray when testing its own moves
+                    if end_piece & TYPE_MASK != KING:
+                        if possible_pin == 0:
+                            possible_pin = end
                         else:
                             break
-                    elif endPiece[0] == opp_color:
-                        type = endPiece[1]
-                        # the following if checks for 5 possibilities to determine whether a piece moving would cause a check
-                        if (0 <= j <= 3 and type == 'R') or \
-                                (4 <= j <= 7 and type == 'B') or \
-                                (i == 1 and type == 'p' and (
-                                        (opp_color == 'w' and 6 <= j <= 7) or (opp_color == 'b' and 4 <= j <= 5))) or \
-                                (type == 'Q') or (i == 1 and type == 'K'):
-                            if possiblePin == ():
-                                in_check = True
-                                checks.append((endRow, endCol, d[0], d[1]))
-                                break
-                            else:
-                                pins.append(possiblePin)
-                                break
+                elif end_piece & opp_color:
+                    piece_type = end_piece & TYPE_MASK
+                    # the following if checks for 5 possibilities to determine whether a piece moving would cause
+                    # a check
+                    if (j <= 3 and piece_type == ROOK) or \
+                            (j >= 4 and piece_type == BISHOP) or \
+                            (distance == 1 and piece_type == PAWN and d in pawn_directions) or \
+                            (piece_type == QUEEN) or (distance == 1 and piece_type == KING):
+                        if possible_pin == 0:
+                            in_check = True
+                            checks.append((end, d))
                         else:
-                            break
+                            pins[possible_pin] = d
+                    break
+                elif end_piece == OFFBOARD:
+                    break
+                end += d
+                distance += 1
         # check for knight attacks
-        knight_moves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, 1), (2, -1))
-        for m in knight_moves:
-            endRow = startRow + m[0]
-            endCol = startCol + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] == opp_color and endPiece[1] == 'N':
-                    in_check = True
-                    checks.append((endRow, endCol, m[0], m[1]))
+        knight = opp_color | KNIGHT
+        for offset in KNIGHT_OFFSETS:
+            if squares[start + offset] == knight:
+                in_check = True
+                checks.append((start + offset, offset))
         return in_check, pins, checks
-
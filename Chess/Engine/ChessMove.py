@@ -1,5 +1,51 @@
 # A move class to help with executing moves
+# A move is packed into one integer: bits 0-6 start square and 7-13 end square (mailbox indices, see Mailbox),
+# bits 14-16 the promotion piece type and bits 17-19 the en passant, castle and capture flags. The low 17 bits,
+# the moveID, identify a move within a position; Move objects compare and hash on it.
+# Move keeps only that integer and the codes of the moved and captured pieces, everything else is derived on access.
+from Engine.Mailbox import EMPTY, PAWN, QUEEN, TYPE_MASK, COLOR_MASK, WHITE, PIECE_NAMES, PIECE_CODES, ROW_COL
+
+TO_SHIFT = 7
+PROMOTION_SHIFT = 14
+SQUARE_MASK = 127
+PROMOTION_MASK = 7 << PROMOTION_SHIFT
+ID_MASK = (1 << 17) - 1
+ENPASSANT_FLAG = 1 << 17
+CASTLE_FLAG = 1 << 18
+CAPTURE_FLAG = 1 << 19
+
+
+def encode(start, end, promotion=EMPTY, flags=0):
+    return start | end << TO_SHIFT | promotion << PROMOTION_SHIFT | flags
+
+
+def decode(code):
+    """
+    Returns (start, end, promotion piece type, flags) of a packed move.
+    """
+    return code & SQUARE_MASK, code >> TO_SHIFT & SQUARE_MASK, code >> PROMOTION_SHIFT & 7, code & ~ID_MASK
+
+
+def fromSquares(start, end, moved, captured, flags=0):
+    """
+    Creates a move from mailbox squares and piece codes; used by move generation instead of the constructor.
+    For en passant, captured is the captured pawn.
+    """
+    move = Move.__new__(Move)
+    code = start | end << TO_SHIFT | flags
+    if captured != EMPTY:
+        code |= CAPTURE_FLAG
+    if moved & TYPE_MASK == PAWN and (end < 30 or end > 90):  # pawn reaching the 8th or the 1st rank
+        code |= QUEEN << PROMOTION_SHIFT  # TODO promotion choice
+    move.code = code
+    move.moved = moved
+    move.captured = captured
+    return move
+
+
 class Move:
+    __slots__ = ('code', 'moved', 'captured')
+
     ranks_to_rows = {"1": 7, "2": 6, "3": 5, "4": 4,
                      "5": 3, "6": 2, "7": 1, "8": 0}
     rows_to_ranks = {v: k for k, v in ranks_to_rows.items()}
@@ -8,31 +54,95 @@ class Move:
     cols_to_files = {v: k for k, v in files_to_cols.items()}
 
     def __init__(self, start_sq, end_sq, board, is_enpassant_move=False, is_castle_move=False):
-        self.startRow = start_sq[0]
-        self.startCol = start_sq[1]
-        self.endRow = end_sq[0]
-        self.endCol = end_sq[1]
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.pieceCaptured = board[self.endRow][self.endCol]
-        # pawn promotion
-        self.isPawnPromotion = (self.pieceMoved == 'wp' and self.endRow == 0) or (
-                    self.pieceMoved == 'bp' and self.endRow == 7)
-        # TODO in main, add if pawn promotion, take promotion choice and store in a field here promotion choice, using optional parameters
-        self.isEnpassantMove = is_enpassant_move
-        if self.isEnpassantMove:
-            self.pieceCaptured = 'wp' if self.pieceMoved == 'bp' else 'bp'
-        self.is_castle_move = is_castle_move
-        self.is_capture = self.pieceCaptured != "--"
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+        start = 21 + 10 * start_sq[0] + start_sq[1]
+        end = 21 + 10 * end_sq[0] + end_sq[1]
+        self.moved = PIECE_CODES[board[start_sq[0]][start_sq[1]]]
+        if is_enpassant_move:
+            self.captured = self.moved ^ COLOR_MASK  # the pawn of the other color
+        else:
+            self.captured = PIECE_CODES[board[end_sq[0]][end_sq[1]]]
+        flags = (ENPASSANT_FLAG if is_enpassant_move else 0) | (CASTLE_FLAG if is_castle_move else 0)
+        if self.captured != EMPTY:
+            flags |= CAPTURE_FLAG
+        promotion = QUEEN if self.moved & TYPE_MASK == PAWN and end_sq[0] in (0, 7) else EMPTY
+        self.code = encode(start, end, promotion, flags)
+
+    @property
+    def startSq(self):
+        return self.code & SQUARE_MASK
+
+    @property
+    def endSq(self):
+        return self.code >> TO_SHIFT & SQUARE_MASK
+
+    @property
+    def startRow(self):
+        return ROW_COL[self.code & SQUARE_MASK][0]
+
+    @property
+    def startCol(self):
+        return ROW_COL[self.code & SQUARE_MASK][1]
+
+    @property
+    def endRow(self):
+        return ROW_COL[self.code >> TO_SHIFT & SQUARE_MASK][0]
+
+    @property
+    def endCol(self):
+        return ROW_COL[self.code >> TO_SHIFT & SQUARE_MASK][1]
+
+    @property
+    def pieceMoved(self):
+        return PIECE_NAMES[self.moved]
+
+    @property
+    def pieceCaptured(self):
+        return PIECE_NAMES[self.captured]
+
+    @property
+    def promotion(self):
+        return self.code >> PROMOTION_SHIFT & 7
+
+    @property
+    def isPawnPromotion(self):
+        return self.code & PROMOTION_MASK != 0
+
+    @property
+    def isEnpassantMove(self):
+        return self.code & ENPASSANT_FLAG != 0
+
+    @property
+    def is_castle_move(self):
+        return self.code & CASTLE_FLAG != 0
+
+    @property
+    def is_capture(self):
+        return self.code & CAPTURE_FLAG != 0
+
+    @property
+    def moveID(self):
+        return self.code & ID_MASK
 
     def __eq__(self, other):
         if isinstance(other, Move):
-            return self.moveID == other.moveID
+            return self.code & ID_MASK == other.code & ID_MASK
         return False
 
+    def __hash__(self):
+        return self.code & ID_MASK
+
     def getChessNotation(self):
         return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
 
+    def getUciNotation(self):
+        """
+        Long algebraic notation with the promotion piece, as the UCI protocol writes moves: e2e4, e7e8q.
+        """
+        notation = self.getChessNotation()
+        if self.isPawnPromotion:
+            notation += PIECE_NAMES[WHITE | self.promotion][1].lower()
+        return notation
+
     def getRankFile(self, r, c):
         return self.cols_to_files[c] + self.rows_to_ranks[r]
 
@@ -0,0 +1,302 @@
+# A long-lived engine process for the GUI and other front ends.
+# The worker keeps its GameState and the AI module's transposition table and history tables for as long as it runs,
+# so they stay warm from one move to the next instead of being rebuilt in a fresh process per move.
+# It is driven through a command queue:
+#   ('newgame', clear_hash)            forget the game and clear the history tables, and the transposition table
+#                                      too if clear_hash
+#   ('position', fen, move_ids)        fen (None for the start position) followed by the moves played, as moveIDs
+#   ('go', search_id, limits)          search the position; limits are AI.search keyword arguments
+#   ('sync', sync_id)                  answered with ('synced', sync_id) once every earlier command is done
+#   ('quit',)
+# and answers each go with ('bestmove', search_id, move_id or None, info) on the response queue, or with
+# ('error', search_id, message) when the search raised or the position before it couldn't be set up. While searching
+# it also sends ('info', search_id, info) after every iteration. The EngineWorker turns an error into a result with
+# no move whose info holds the message under 'error', so a front end carries on instead of waiting for a reply.
+# Stopping goes through a shared value holding the id of the last search to stop, so it reaches the worker in the
+# middle of a search, and a stop sent before the worker has even started that search is not lost.
+# Given shared_hash, a (name, size_mb) pair from TranspositionTable.createShared, the worker searches with that shared
+# table instead of its own; ParallelSearch runs several workers on one table this way.
+# Pondering is a search of the position after the reply the engine expects, run without a time limit while the
+# opponent thinks; ponderHit turns it into a normal timed search when the opponent plays that reply, and stop
+# abandons it when they don't. The limit is kept in this process, which interrupts the search once it runs out.
+# Given book_path, the worker plays from that Polyglot opening book first. Each process maps the file read-only, so
+# the operating system keeps a single copy of it in memory however many workers use it.
+import queue
+import random
+import sys
+import time
+from multiprocessing import Process, Queue, Value
+from Engine import AI
+from Engine import Backends
+from Engine import ChessEngine
+from Engine import TranspositionTable
+
+
+def findMove(gs, move_id):
+    for move in gs.getValidMoves():
+        if move.moveID == move_id:
+            return move
+    raise ValueError("illegal move " + str(move_id) + " in the engine's position")
+
+
+def errorInfo(message):
+    """
+    The info of a search that failed with message, with the keys of AI.searchInfo so that callers can read it as usual.
+    """
+    return {'depth': 0, 'score': 0.0, 'nodes': 0, 'qnodes': 0, 'time': 0.0, 'hashfull': 0, 'book': False, 'pv': [],
+            'statistics': None, 'move': None, 'error': message}
+
+
+def setPosition(gs, fen, move_ids):
+    """
+    Brings gs to fen + move_ids, undoing and replaying only the moves that differ from its current move log.
+    """
+    fen = fen or ChessEngine.START_FEN
+    if fen != gs.startFen:
+        gs.loadFen(fen)
+    common = 0
+    while common < len(gs.moveLog) and common < len(move_ids) and gs.moveLog[common].moveID == move_ids[common]:
+        common += 1
+    while len(gs.moveLog) > common:
+        gs.undoMove()
+    for move_id in move_ids[common:]:
+        gs.makeMove(findMove(gs, move_id))
+
+
+class StopFlag:
+    """
+    The worker's AI.stop_event: set once the search with id searchID, or a later one, has been stopped.
+    """
+    def __init__(self, stopped_id):
+        self.stoppedID = stopped_id
+        self.searchID = 0
+
+    def is_set(self):
+        return self.stoppedID.value >= self.searchID
+
+
+def workerLoop(backend, commands, responses, stopped_id, shared_hash=None, book_path=None):
+    stop_flag = StopFlag(stopped_id)
+    AI.stop_event = stop_flag
+    if book_path is not None:
+        AI.setOpeningBook(book_path)
+    if shared_hash is not None:
+        AI.transposition_table = TranspositionTable.attachShared(*shared_hash)
+    random.seed()  # forked workers would otherwise all shuffle the root moves the same way
+    gs = Backends.createGameState(backend)
+    position_error = None  # reported to the next go, which would otherwise search the wrong position
+    while True:
+        command = commands.get()
+        name = command[0]
+        if name == 'quit':
+            AI.transposition_table.close()
+            break
+        elif name == 'newgame':
+            gs = Backends.createGameState(backend)
+            if command[1]:
+                AI.transposition_table.clear()
+            AI.move_orderer.clear()
+        elif name == 'sync':
+            responses.put(('synced', command[1]))
+        elif name == 'position':
+            position_error = None
+            try:
+                setPosition(gs, command[1], command[2])
+            except ValueError as error:
+                gs = Backends.createGameState(backend)
+                position_error = str(error)
+        elif name == 'go':
+            search_id, limits = command[1], command[2]
+            stop_flag.searchID = search_id
+            if position_error is not None:
+                responses.put(('error', search_id, position_error))
+                continue
+            start_time = time.perf_counter()
+            try:
+                move, statistics = AI.search(gs, gs.getValidMoves(),
+                                             info_callback=lambda info: responses.put(('info', search_id, info)),
+                                             **limits)
+                info = AI.searchInfo(gs, start_time)
+            except Exception as error:
+                responses.put(('error', search_id, "search failed: %s: %s" % (type(error).__name__, error)))
+                continue
+            info['statistics'] = statistics
+            info['move'] = move.getChessNotation() if move else None
+            responses.put(('bestmove', search_id, move.moveID if move is not None else None, info))
+        else:
+            responses.put(('error', None, "unknown command " + str(name)))
+
+
+class EngineWorker:
+    def __init__(self, backend=Backends.DEFAULT_BACKEND, shared_hash=None, book_path=None):
+        self.commands = Queue()
+        self.responses = Queue()
+        self.stoppedID = Value('q', 0)  # the worker abandons searches with ids up to this one
+        self.searchID = 0  # id of the latest go, results of earlier searches are dropped
+        self.searching = False
+        self.infoCallback = None
+        self.syncID = 0
+        self.pondering = False  # the latest search is a ponder search that hasn't had its ponderHit yet
+        self.ponderStart = None
+        self.ponderTime = None  # seconds the ponder search is given from its start once it is a hit
+        self.ponderDeadline = None  # time.perf_counter() value at which a hit ponder search is interrupted
+        self.ponderResult = None  # result of a ponder search that finished before its ponderHit
+        self.process = Process(target=workerLoop,
+                               args=(backend, self.commands, self.responses, self.stoppedID, shared_hash, book_path),
+                               daemon=True)
+        self.process.start()
+
+    def newGame(self, clear_hash=True):
+        """
+        clear_hash=False leaves the transposition table alone, for a table shared with other workers that its owner
+        clears once.
+        """
+        self.stop()
+        self.commands.put(('newgame', clear_hash))
+
+    def sync(self):
+        """
+        Blocks until the worker has handled every command sent before, so that a stopped search has unwound.
+        """
+        self.syncID += 1
+        self.commands.put(('sync', self.syncID))
+        while True:
+            response = self.responses.get()
+            if response[0] == 'synced':
+                if response[1] == self.syncID:
+                    return
+            else:
+                self.handleResponse(response)
+
+    def setPosition(self, move_ids, fen=None):
+        self.commands.put(('position', fen, list(move_ids)))
+
+    def go(self, info_callback=None, ponder=False, **limits):
+        """
+        Starts a search of the last position set, with AI.search's limits (max_depth, move_time, time_left,
+        increment, max_nodes, depth_offset, profile). The result is collected with poll or waitForMove, which also
+        pass the info of every completed iteration to info_callback. The final info holds the SearchStatistics under
+        'statistics'.
+        With ponder the position set is the one after the opponent's expected reply. The search then runs without a
+        time limit, and its result is held back until ponderHit; the time it spent before the hit counts towards
+        the move time or clock share it is given.
+        """
+        self.pondering = ponder
+        self.ponderDeadline = None
+        self.ponderResult = None
+        if ponder:
+            if limits.get('time_left') is not None:
+                self.ponderTime = AI.allocateTime(limits['time_left'], limits.get('increment', 0.0))
+            else:
+                self.ponderTime = limits.get('move_time', AI.MOVE_TIME)
+            limits = dict(limits, move_time=None, time_left=None)
+            self.ponderStart = time.perf_counter()
+        self.searchID += 1
+        self.searching = True
+        self.infoCallback = info_callback
+        self.commands.put(('go', self.searchID, limits))
+        return self.searchID
+
+    def ponderHit(self):
+        """
+        The opponent played the expected reply: the ponder search carries on as the search for the move, with its
+        tables already warm, until its time is up.
+        """
+        if not self.pondering:
+            return
+        self.pondering = False
+        if self.searching and self.ponderTime is not None:
+            self.ponderDeadline = self.ponderStart + self.ponderTime
+
+    def checkPonderDeadline(self):
+        if self.ponderDeadline is not None and time.perf_counter() >= self.ponderDeadline:
+            self.ponderDeadline = None
+            self.interrupt()
+
+    def interrupt(self):
+        """
+        Makes the current search return its best move so far, to be collected as usual.
+        """
+        self.stoppedID.value = self.searchID
+
+    def stop(self):
+        """
+        Makes the current search return its best move so far; that result is discarded. Abandons pondering.
+        """
+        self.pondering = False
+        self.ponderDeadline = None
+        self.ponderResult = None
+        if self.searching:
+            self.interrupt()
+            self.searchID += 1
+            self.searching = False
+
+    def poll(self):
+        """
+        Returns (move_id, info) once the latest search has finished, None while it is running.
+        move_id is None when the position has no legal moves, or when the search failed; info['error'] then holds
+        the message.
+        """
+        if self.ponderResult is not None and not self.pondering:
+            result, self.ponderResult = self.ponderResult, None
+            return result
+        self.checkPonderDeadline()
+        while True:
+            try:
+                response = self.responses.get_nowait()
+            except queue.Empty:
+                return None
+            result = self.handleResponse(response)
+            if result is not None:
+                return result
+
+    def waitForMove(self, timeout=None):
+        """
+        Blocks until the latest search has finished and returns (move_id, info), or None after timeout seconds.
+        """
+        end_time = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            result = self.poll()
+            if result is not None:
+                return result
+            now = time.perf_counter()
+            remaining = None if end_time is None else max(0.0, end_time - now)
+            if self.ponderDeadline is not None:  # wake up in time to interrupt the search
+                until_deadline = max(0.0, self.ponderDeadline - now)
+                remaining = until_deadline if remaining is None else min(remaining, until_deadline)
+            try:
+                response = self.responses.get(timeout=remaining)
+            except queue.Empty:
+                if end_time is None or time.perf_counter() < end_time:
+                    continue  # woken up for the ponder deadline
+                return None
+            result = self.handleResponse(response)
+            if result is not None:
+                return result
+
+    def handleResponse(self, response):
+        if response[1] != self.searchID:
+            if response[0] == 'error' and response[1] is None:
+                sys.stderr.write("engine worker: " + response[2] + "\n")
+            return None  # a stopped search
+        if response[0] == 'info':
+            if self.infoCallback is not None:
+                self.infoCallback(response[2])
+            return None
+        if response[0] == 'error':
+            move_id, info = None, errorInfo(response[2])
+        else:
+            _, _, move_id, info = response
+        self.searching = False
+        self.ponderDeadline = None
+        if self.pondering:
+            self.ponderResult = move_id, info  # kept for ponderHit, a miss throws it away
+            return None
+        return move_id, info
+
+    def quit(self):
+        self.stop()
+        self.commands.put(('quit',))
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
@@ -0,0 +1,58 @@
+# Integer board encoding used by GameState.
+# The board is a 10x12 mailbox: the 8x8 playing area sits inside a border of OFFBOARD sentinels (two ranks above and
+# below, one file left and right), so stepping off the board in any direction, including knight jumps, lands on a
+# sentinel instead of needing a range check. Square index = 21 + 10 * row + col, with row 0 being the 8th rank.
+
+EMPTY = 0
+PAWN = 1
+KNIGHT = 2
+BISHOP = 3
+ROOK = 4
+QUEEN = 5
+KING = 6
+OFFBOARD = 7  # has neither colour bit, so it is neither empty nor a capturable piece
+TYPE_MASK = 7
+
+WHITE = 8
+BLACK = 16
+COLOR_MASK = WHITE | BLACK
+
+# piece code -> name used by the drawing code and Move ('wp', 'bK', '--' for empty)
+PIECE_NAMES = ['--'] * 24
+for _color, _prefix in ((WHITE, 'w'), (BLACK, 'b')):
+    for _type, _letter in ((PAWN, 'p'), (KNIGHT, 'N'), (BISHOP, 'B'), (ROOK, 'R'), (QUEEN, 'Q'), (KING, 'K')):
+        PIECE_NAMES[_color | _type] = _prefix + _letter
+PIECE_CODES = {name: code for code, name in enumerate(PIECE_NAMES) if name != '--'}
+PIECE_CODES['--'] = EMPTY
+
+# directions as index offsets
+N, S, E, W = -10, 10, 1, -1
+NE, NW, SE, SW = -9, -11, 11, 9
+ROOK_DIRECTIONS = (N, W, S, E)
+BISHOP_DIRECTIONS = (NW, NE, SE, SW)
+KING_DIRECTIONS = ROOK_DIRECTIONS + (NW, NE, SW, SE)
+KNIGHT_OFFSETS = (-21, -19, -12, -8, 8, 12, 19, 21)
+
+
+def square(row, col):
+    return 21 + 10 * row + col
+
+
+# corner squares, where the rooks start
+A8, H8, A1, H1 = square(0, 0), square(0, 7), square(7, 0), square(7, 7)
+
+# the 64 playing squares in row-major order from a8 to h1
+SQUARES = tuple(square(r, c) for r in range(8) for c in range(8))
+
+# mailbox index -> (row, col), None for border squares
+ROW_COL = [None] * 120
+for _r in range(8):
+    for _c in range(8):
+        ROW_COL[square(_r, _c)] = (_r, _c)
+
+
+def emptyMailbox():
+    squares = [OFFBOARD] * 120
+    for s in SQUARES:
+        squares[s] = EMPTY
+    return squares
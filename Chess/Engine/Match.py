@@ -0,0 +1,305 @@
+# Engine-versus-engine matches for testing changes. Games are played over a process pool and written to a PGN file
+# as they finish; the wins, draws and losses of the first engine are reported with an Elo estimate, and an optional
+# SPRT stops the match as soon as the result is clear. Run from the Chess directory, e.g.
+#   python -m Engine.Match --first "name=new depth=3 BATCH_LEAVES=True" --second "name=base depth=3" \
+#       --games 1000 --concurrency 8 --openings openings.epd --pgn match.pgn --sprt 0 10
+# Engine options are name, depth, movetime (seconds per move), time and inc (a clock in seconds for the game and
+# per move); any other NAME=value sets that AI module global while the engine is searching.
+# Openings come from a PGN file (the first --opening-plies plies of each game) or a file with a FEN or EPD per line.
+# Each opening is played twice with colors reversed. Games are drawn by threefold repetition, the fifty-move rule,
+# bare kings (or a single minor piece) and after --max-plies plies.
+import argparse
+import ast
+import math
+import os
+import random
+import sys
+import time
+from multiprocessing import Pool
+from Engine import AI
+from Engine import Analysis
+from Engine import Backends
+from Engine import MoveOrdering
+from Engine import Pgn
+from Engine import TranspositionTable
+from Engine.Mailbox import SQUARES, TYPE_MASK, PAWN, KNIGHT, BISHOP, KING, EMPTY
+
+ENGINE_KEYS = ('name', 'depth', 'movetime', 'time', 'inc')
+MAX_PLIES = 400
+FIFTY_MOVE_PLIES = 100
+
+_players = {}  # engine name -> EnginePlayer, per pool process
+
+
+def parseEngine(text, default_name):
+    """
+    Returns the engine configuration dict for a "key=value ..." option string.
+    """
+    config = {'name': default_name, 'depth': None, 'movetime': None, 'time': None, 'inc': 0.0, 'settings': {}}
+    for item in text.split():
+        key, _, value = item.partition('=')
+        if key == 'name':
+            config['name'] = value
+        elif key == 'depth':
+            config['depth'] = int(value)
+        elif key in ENGINE_KEYS:
+            config[key] = float(value)
+        elif key.isupper() and hasattr(AI, key):
+            try:
+                config['settings'][key] = ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                config['settings'][key] = value
+        else:
+            raise ValueError("unknown engine option " + key)
+    if config['depth'] is None and config['movetime'] is None and config['time'] is None:
+        config['depth'] = 3
+    return config
+
+
+def readOpenings(path, plies):
+    """
+    Returns a list of (fen or None, SANs) openings from a PGN file, or from a file with a FEN or EPD per line.
+    """
+    with open(path, encoding='utf-8', errors='replace') as opening_file:
+        if path.lower().endswith('.pgn'):
+            return [(headers.get('FEN'), sans[:plies]) for headers, sans, _ in Pgn.readGames(opening_file)]
+        return [(fen, []) for _, fen, _ in Analysis.readRecords(opening_file)]
+
+
+class EnginePlayer:
+    """
+    One side of a match inside a pool process: its own transposition table and history, and its AI settings.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.table = TranspositionTable.TranspositionTable(AI.HASH_SIZE_MB)
+        self.orderer = MoveOrdering.MoveOrderer()
+        self.defaults = {}  # values of the AI globals this engine changes, put back after each search
+        self.previousLine = None  # AI.previous_line of this engine's last search, so it isn't seeded by the other's
+
+    def newGame(self):
+        self.table.clear()
+        self.orderer.clear()
+        self.previousLine = None
+
+    def findMove(self, gs, valid_moves, time_left=None):
+        config = self.config
+        AI.transposition_table, AI.move_orderer, AI.previous_line = self.table, self.orderer, self.previousLine
+        for name, value in config['settings'].items():
+            self.defaults.setdefault(name, getattr(AI, name))
+            setattr(AI, name, value)
+        try:
+            return AI.findBestMove(gs, valid_moves, max_depth=config['depth'] or AI.MAX_DEPTH,
+                                   move_time=config['movetime'], time_left=time_left, increment=config['inc'])
+        finally:
+            self.previousLine = AI.previous_line
+            for name, value in self.defaults.items():
+                setattr(AI, name, value)
+
+
+def getPlayer(config):
+    player = _players.get(config['name'])
+    if player is None:
+        player = _players[config['name']] = EnginePlayer(config)
+    return player
+
+
+def initWorker():
+    random.seed()  # forked pool processes would otherwise play identical games
+
+
+def insufficientMaterial(gs):
+    minors = 0
+    for s in SQUARES:
+        piece_type = gs.squares[s] & TYPE_MASK
+        if piece_type in (KNIGHT, BISHOP):
+            minors += 1
+        elif piece_type not in (EMPTY, KING):
+            return False
+    return minors <= 1
+
+
+def playGame(task):
+    """
+    Plays one game in a pool process. task is (round, fen, opening SANs, white config, black config, max_plies,
+    backend); returns (round, PGN headers, SANs, result) with the result from white's point of view.
+    """
+    round_number, fen, opening, white, black, max_plies, backend = task
+    gs = Backends.createGameState(backend, fen)
+    fields = fen.split() if fen is not None else []
+    # plies since the last capture or pawn move, starting from the halfmove clock of the FEN
+    quiet_plies = int(fields[4]) if len(fields) > 4 and fields[4].isdigit() else 0
+    sans = []
+    for san in opening:
+        move = Pgn.sanToMove(gs, san)
+        if move is None:
+            break
+        sans.append(Pgn.moveToSan(gs, move))
+        quiet_plies = 0 if move.is_capture or move.moved & TYPE_MASK == PAWN else quiet_plies + 1
+        gs.makeMove(move)
+    configs = (white, black)
+    players = [getPlayer(config) for config in configs]
+    for player in players:
+        player.newGame()
+    clocks = [config['time'] for config in configs]
+    result = termination = None
+    while result is None:
+        valid_moves = gs.getValidMoves()
+        side = 0 if gs.whiteToMove else 1
+        if not valid_moves:
+            result, termination = ('1/2-1/2', 'stalemate') if gs.stalemate else (('0-1', '1-0')[side], 'checkmate')
+            break
+        if gs.zobristKeyLog.count(gs.zobristKey) >= 3:
+            result, termination = '1/2-1/2', 'threefold repetition'
+        elif quiet_plies >= FIFTY_MOVE_PLIES:
+            result, termination = '1/2-1/2', 'fifty-move rule'
+        elif insufficientMaterial(gs):
+            result, termination = '1/2-1/2', 'insufficient material'
+        elif len(sans) >= max_plies:
+            result, termination = '1/2-1/2', 'adjudication'
+        if result is not None:
+            break
+        start_time = time.perf_counter()
+        move = players[side].findMove(gs, valid_moves, clocks[side])
+        if clocks[side] is not None:
+            clocks[side] -= time.perf_counter() - start_time
+            if clocks[side] < 0:
+                result, termination = ('0-1', '1-0')[side], 'time forfeit'
+                break
+            clocks[side] += configs[side]['inc']
+        sans.append(Pgn.moveToSan(gs, move, valid_moves))
+        quiet_plies = 0 if move.is_capture or move.moved & TYPE_MASK == PAWN else quiet_plies + 1
+        gs.makeMove(move)
+    headers = {'Event': "Engine match", 'Site': "?", 'Date': time.strftime("%Y.%m.%d"), 'Round': round_number,
+               'White': white['name'], 'Black': black['name'], 'Result': result}
+    if fen is not None:
+        headers['SetUp'] = '1'
+        headers['FEN'] = fen
+    headers['PlyCount'] = len(sans)
+    headers['Termination'] = termination
+    return round_number, headers, sans, result
+
+
+def eloFromScore(score):
+    """
+    Elo difference for an expected score between 0 and 1.
+    """
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return 400 * math.log10(score / (1 - score))
+
+
+def matchElo(wins, draws, losses):
+    """
+    Returns (Elo difference, 95% error margin) for a match result.
+    """
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    return eloFromScore(score), (eloFromScore(score + margin) - eloFromScore(score - margin)) / 2
+
+
+def sprtLLR(wins, draws, losses, elo0, elo1):
+    """
+    Log-likelihood ratio of elo1 against elo0 for a match result (the normal approximation of the trinomial GSPRT).
+    """
+    games = wins + draws + losses
+    if games == 0 or wins + losses == 0:
+        return 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance <= 0:
+        return 0.0
+    score0 = 1 / (1 + 10 ** (-elo0 / 400))
+    score1 = 1 / (1 + 10 ** (-elo1 / 400))
+    return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+def sprtBounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def matchTasks(first, second, openings, games, max_plies, backend):
+    for game in range(games):
+        fen, opening = openings[(game // 2) % len(openings)]
+        white, black = (first, second) if game % 2 == 0 else (second, first)
+        yield game + 1, fen, opening, white, black, max_plies, backend
+
+
+def runMatch(first, second, openings, games, concurrency, pgn_path=None, max_plies=MAX_PLIES, sprt=None,
+             backend=Backends.DEFAULT_BACKEND, out=sys.stdout):
+    """
+    Plays the match and returns (wins, draws, losses) of first. sprt is None or (elo0, elo1, alpha, beta).
+    """
+    wins = draws = losses = 0
+    bounds = sprtBounds(sprt[2], sprt[3]) if sprt is not None else None
+    pgn_file = open(pgn_path, 'w') if pgn_path else None
+    try:
+        with Pool(concurrency, initializer=initWorker) as pool:
+            tasks = matchTasks(first, second, openings, games, max_plies, backend)
+            for played, (round_number, headers, sans, result) in enumerate(pool.imap_unordered(playGame, tasks), 1):
+                if pgn_file is not None:
+                    pgn_file.write(Pgn.writeGame(headers, sans, result))
+                    pgn_file.flush()
+                if result == '1/2-1/2':
+                    draws += 1
+                elif (result == '1-0') == (headers['White'] == first['name']):
+                    wins += 1
+                else:
+                    losses += 1
+                elo, margin = matchElo(wins, draws, losses)
+                line = "game %d/%d  %s - %s %s (%s)  score %d-%d-%d  elo %+.1f +/- %.1f" % (
+                    played, games, headers['White'], headers['Black'], result, headers['Termination'], wins, draws,
+                    losses, elo, margin)
+                if sprt is not None:
+                    llr = sprtLLR(wins, draws, losses, sprt[0], sprt[1])
+                    line += "  llr %.2f (%.2f, %.2f)" % (llr, bounds[0], bounds[1])
+                out.write(line + "\n")
+                out.flush()
+                if sprt is not None and not bounds[0] < llr < bounds[1]:
+                    out.write("SPRT: H%d accepted\n" % (1 if llr >= bounds[1] else 0))
+                    break  # leaving the with block terminates the games still running
+    finally:
+        if pgn_file is not None:
+            pgn_file.close()
+    return wins, draws, losses
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Engine-versus-engine match")
+    parser.add_argument('--first', default="name=first", help="options of the engine being tested")
+    parser.add_argument('--second', default="name=second", help="options of the reference engine")
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=os.cpu_count() or 1, help="games played at once")
+    parser.add_argument('--openings', help="PGN, EPD or FEN file, the start position if left out")
+    parser.add_argument('--opening-plies', type=int, default=8, help="plies of each PGN opening to play")
+    parser.add_argument('--pgn', help="file the games are written to")
+    parser.add_argument('--max-plies', type=int, default=MAX_PLIES, help="plies after which a game is drawn")
+    parser.add_argument('--sprt', type=float, nargs=2, metavar=('ELO0', 'ELO1'),
+                        help="stop once the match shows first is ELO1 rather than ELO0 stronger, or the reverse")
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    parser.add_argument('--backend', default=Backends.DEFAULT_BACKEND, choices=sorted(Backends.BACKENDS))
+    args = parser.parse_args(argv)
+    try:
+        first = parseEngine(args.first, 'first')
+        second = parseEngine(args.second, 'second')
+    except ValueError as error:
+        parser.error(str(error))
+    if first['name'] == second['name']:
+        parser.error("the engines need different names")
+    openings = readOpenings(args.openings, args.opening_plies) if args.openings else [(None, [])]
+    if not openings:
+        parser.error("no openings in " + args.openings)
+    sprt = (args.sprt[0], args.sprt[1], args.alpha, args.beta) if args.sprt else None
+    wins, draws, losses = runMatch(first, second, openings, args.games, args.concurrency, args.pgn, args.max_plies,
+                                   sprt, args.backend)
+    elo, margin = matchElo(wins, draws, losses)
+    print("%s vs %s: +%d =%d -%d  elo %+.1f +/- %.1f" % (first['name'], second['name'], wins, draws, losses, elo,
+                                                          margin))
+
+
+if __name__ == '__main__':
+    main()
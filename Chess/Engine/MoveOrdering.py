@@ -0,0 +1,134 @@
+# Move ordering for the alpha-beta search: the better the first moves searched, the earlier the cutoffs.
+# Moves are tried in this order: the transposition table move, captures and promotions by MVV-LVA (most valuable
+# victim, least valuable attacker), the killer moves of the ply, and the remaining quiet moves by history score.
+# stagedMoves produces the same order lazily, with captures that may lose material moved to the end.
+from Engine.ChessMove import ID_MASK, SQUARE_MASK, TO_SHIFT, PROMOTION_MASK, CAPTURE_FLAG
+from Engine.Mailbox import TYPE_MASK, KING
+
+# piece values used only to rank captures, indexed by piece type (pawn, knight, bishop, rook, queen, king)
+ORDER_VALUES = (0, 1, 3, 3, 5, 9, 10, 0)
+
+TT_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 24
+KILLER_SCORES = (1 << 23, (1 << 23) - 1)
+MAX_PLY = 64
+MAX_HISTORY = 1 << 20  # history scores are halved once one reaches this, so they stay below the killers
+
+
+def isLosingCapture(move):
+    """
+    A capture of a less valuable piece, which loses material if the captured piece was defended.
+    The king can only take undefended pieces, so its captures never lose.
+    """
+    moved = move.moved & TYPE_MASK
+    return not move.code & PROMOTION_MASK and moved != KING and \
+        ORDER_VALUES[moved] > ORDER_VALUES[move.captured & TYPE_MASK]
+
+
+class MoveOrderer:
+    def __init__(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY)]  # two move ids per ply
+        self.history = [[0] * (120 * 120), [0] * (120 * 120)]  # [white, black][startSq * 120 + endSq]
+
+    def clear(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [[0] * (120 * 120), [0] * (120 * 120)]
+
+    def newSearch(self):
+        """
+        Killers only apply to the search they were found in; history is kept but aged.
+        """
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        for table in self.history:
+            for i in range(len(table)):
+                if table[i]:
+                    table[i] >>= 1
+
+    def scoreMove(self, move, ply, tt_move_id, history):
+        code = move.code
+        move_id = code & ID_MASK
+        if move_id == tt_move_id:
+            return TT_MOVE_SCORE
+        if code & (CAPTURE_FLAG | PROMOTION_MASK):
+            score = CAPTURE_SCORE
+            if code & CAPTURE_FLAG:
+                score += 16 * ORDER_VALUES[move.captured & TYPE_MASK] - ORDER_VALUES[move.moved & TYPE_MASK]
+            if code & PROMOTION_MASK:
+                score += 16 * ORDER_VALUES[move.promotion]
+            return score
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if move_id == killers[0]:
+                return KILLER_SCORES[0]
+            if move_id == killers[1]:
+                return KILLER_SCORES[1]
+        return history[(code & SQUARE_MASK) * 120 + (code >> TO_SHIFT & SQUARE_MASK)]
+
+    def orderMoves(self, moves, ply, tt_move_id, white_to_move):
+        """
+        Sorts moves in place, best candidates first.
+        """
+        history = self.history[0 if white_to_move else 1]
+        moves.sort(key=lambda move: self.scoreMove(move, ply, tt_move_id, history), reverse=True)
+
+    def stagedMoves(self, gs, ply, tt_move_id):
+        """
+        Yields the legal moves of gs in stages, each generated only once the previous ones failed to cut off: the
+        transposition table move, winning captures and promotions, killer moves, quiet moves by history and losing
+        captures. In check every evasion is generated at once. The caller must undo each move before taking the
+        next one. When nothing is yielded, gs.checkmate or gs.stalemate has been set.
+        """
+        searched = set()
+        hash_move = gs.getMoveByID(tt_move_id)
+        if hash_move is not None:
+            searched.add(hash_move.moveID)
+            yield hash_move
+        captures = gs.getCaptureMoves()
+        if gs.in_check:  # these are all the evasions
+            self.orderMoves(captures, ply, tt_move_id, gs.whiteToMove)
+            yield from captures
+            return
+        history = self.history[0 if gs.whiteToMove else 1]
+        captures.sort(key=lambda move: self.scoreMove(move, ply, None, history), reverse=True)
+        losing_captures = []
+        for move in captures:
+            if move.moveID in searched:
+                continue
+            if move.is_capture and isLosingCapture(move):
+                losing_captures.append(move)
+            else:
+                searched.add(move.moveID)
+                yield move
+        if ply < MAX_PLY:
+            for killer_id in self.killers[ply]:
+                if killer_id is None or killer_id in searched:
+                    continue
+                move = gs.getMoveByID(killer_id)
+                if move is not None and not move.is_capture and not move.isPawnPromotion:
+                    searched.add(killer_id)
+                    yield move
+        quiet_moves = [move for move in gs.getQuietMoves() if move.moveID not in searched]
+        if not searched and not quiet_moves and not losing_captures:
+            gs.checkmate, gs.stalemate = False, True  # not in check, so no legal move is stalemate
+            return
+        quiet_moves.sort(key=lambda move: history[move.startSq * 120 + move.endSq], reverse=True)
+        yield from quiet_moves
+        yield from losing_captures
+
+    def recordCutoff(self, move, ply, depth, white_to_move):
+        """
+        Called when move caused a beta cutoff; a quiet move becomes a killer of the ply and gains history.
+        """
+        if move.is_capture or move.isPawnPromotion:
+            return
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move.moveID:
+                killers[1] = killers[0]
+                killers[0] = move.moveID
+        history = self.history[0 if white_to_move else 1]
+        index = move.startSq * 120 + move.endSq
+        history[index] += depth * depth
+        if history[index] >= MAX_HISTORY:
+            for i in range(len(history)):
+                history[i] >>= 1
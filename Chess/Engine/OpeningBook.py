@@ -0,0 +1,188 @@
+# Opening books in the Polyglot .bin format.
+# A book is a file of 16 byte big-endian entries sorted by position key: key (8 bytes), move (2), weight (2) and
+# learn (4, unused here). The key is the Polyglot hash of the position (see polyglotKey), not GameState.zobristKey.
+# A move packs to file (bits 0-2), to rank (3-5), from file (6-8), from rank (9-11) and promotion piece (12-14);
+# castling is written as the king taking its own rook.
+# OpeningBook memory-maps the file read-only, so lookups touch only the pages they need and the operating system
+# shares the pages between every process that opens the same book.
+# Build a book from PGN files, from the Chess directory:
+#   python -m Engine.OpeningBook games.pgn [more.pgn ...] --output book.bin [--plies 20]
+import argparse
+import mmap
+import random
+import struct
+from collections import defaultdict
+from Engine import Backends
+from Engine import Pgn
+from Engine.Mailbox import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, TYPE_MASK, COLOR_MASK, WHITE, BLACK, SQUARES, \
+    ROW_COL, square
+from Engine.PolyglotRandom import POLYGLOT_RANDOM
+
+ENTRY = struct.Struct('>QHHI')
+CASTLE_OFFSET = 768
+ENPASSANT_OFFSET = 772
+TURN_OFFSET = 780
+PROMOTION_PIECES = {KNIGHT: 1, BISHOP: 2, ROOK: 3, QUEEN: 4}
+MAX_WEIGHT = 0xFFFF
+
+# piece code -> Polyglot piece kind (black pawn 0, white pawn 1, black knight 2, ... white king 11)
+_KINDS = {}
+for _type in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING):
+    _KINDS[WHITE | _type] = 2 * (_type - 1) + 1
+    _KINDS[BLACK | _type] = 2 * (_type - 1)
+
+
+def polyglotKey(gs):
+    key = 0
+    squares = gs.squares
+    for s in SQUARES:
+        piece = squares[s]
+        if piece in _KINDS:
+            row, col = ROW_COL[s]
+            key ^= POLYGLOT_RANDOM[64 * _KINDS[piece] + 8 * (7 - row) + col]
+    rights = gs.currentCastlingRights
+    for offset, right in enumerate((rights.wks, rights.wqs, rights.bks, rights.bqs)):
+        if right:
+            key ^= POLYGLOT_RANDOM[CASTLE_OFFSET + offset]
+    # the en passant file only counts if a pawn of the side to move stands ready to take
+    if gs.enpassantPossible:
+        ep = gs.enpassantPossible
+        behind = ep + 10 if gs.whiteToMove else ep - 10  # square of the pawn that just advanced two squares
+        own_pawn = (WHITE if gs.whiteToMove else BLACK) | PAWN
+        if squares[behind - 1] == own_pawn or squares[behind + 1] == own_pawn:
+            key ^= POLYGLOT_RANDOM[ENPASSANT_OFFSET + ROW_COL[ep][1]]
+    if gs.whiteToMove:
+        key ^= POLYGLOT_RANDOM[TURN_OFFSET]
+    return key
+
+
+def encodeMove(move):
+    start_row, start_col = ROW_COL[move.startSq]
+    end_row, end_col = ROW_COL[move.endSq]
+    if move.is_castle_move:
+        end_col = 7 if end_col > start_col else 0  # the king takes its rook
+    promotion = PROMOTION_PIECES.get(move.promotion, 0)
+    return end_col | (7 - end_row) << 3 | start_col << 6 | (7 - start_row) << 9 | promotion << 12
+
+
+def decodeMove(gs, book_move, valid_moves):
+    """
+    Returns the legal move matching a Polyglot move, or None (also for under-promotions, which the engine lacks).
+    """
+    start = square(7 - (book_move >> 9 & 7), book_move >> 6 & 7)
+    end = square(7 - (book_move >> 3 & 7), book_move & 7)
+    promotion = book_move >> 12 & 7
+    if promotion and promotion != PROMOTION_PIECES[QUEEN]:
+        return None
+    king = gs.squares[start]
+    if king & TYPE_MASK == KING and gs.squares[end] == (king & COLOR_MASK) | ROOK:
+        end = start + 2 if end > start else start - 2  # castling, the king takes its own rook
+    for move in valid_moves:
+        if move.startSq == start and move.endSq == end:
+            return move
+    return None
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.path = path
+        self.open()
+
+    def open(self):
+        with open(self.path, 'rb') as book_file:
+            self.data = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.entryCount = len(self.data) // ENTRY.size
+
+    def __getstate__(self):
+        return {'path': self.path}  # a worker process maps the file itself
+
+    def __setstate__(self, state):
+        self.path = state['path']
+        self.open()
+
+    def close(self):
+        self.data.close()
+
+    def entries(self, key):
+        """
+        Returns the (move, weight) pairs stored for a Polyglot key, found by binary search.
+        """
+        low, high = 0, self.entryCount
+        while low < high:
+            middle = (low + high) // 2
+            if ENTRY.unpack_from(self.data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        result = []
+        for i in range(low, self.entryCount):
+            entry_key, move, weight, _ = ENTRY.unpack_from(self.data, i * ENTRY.size)
+            if entry_key != key:
+                break
+            result.append((move, weight))
+        return result
+
+    def findMove(self, gs, valid_moves=None, rng=random):
+        """
+        Returns a book move for the position, chosen at random in proportion to the weights, or None.
+        """
+        if valid_moves is None:
+            valid_moves = gs.getValidMoves()
+        candidates = []
+        for book_move, weight in self.entries(polyglotKey(gs)):
+            move = decodeMove(gs, book_move, valid_moves)
+            if move is not None and weight > 0:
+                candidates.append((move, weight))
+        if not candidates:
+            return None
+        return rng.choices([move for move, _ in candidates], weights=[weight for _, weight in candidates])[0]
+
+
+def buildBook(pgn_paths, output_path, max_plies=20, backend=Backends.DEFAULT_BACKEND):
+    """
+    Writes a Polyglot book with the moves played in the first max_plies plies of the games in pgn_paths.
+    A move scores 2 for every game its side won and 1 for every draw; moves that never scored are left out.
+    Games are followed until their first move the engine can't play (e.g. an under-promotion).
+    Returns the number of entries written.
+    """
+    weights = defaultdict(int)  # (key, polyglot move) -> weight
+    for path in pgn_paths:
+        with open(path, encoding='utf-8', errors='replace') as pgn_file:
+            for headers, sans, result in Pgn.readGames(pgn_file):
+                if 'FEN' in headers:
+                    continue  # only games from the standard starting position
+                gs = Backends.createGameState(backend)
+                for san in sans[:max_plies]:
+                    move = Pgn.sanToMove(gs, san)
+                    if move is None:
+                        break
+                    if result == '1/2-1/2':
+                        score = 1
+                    elif result == ('1-0' if gs.whiteToMove else '0-1'):
+                        score = 2
+                    else:
+                        score = 0
+                    if score:
+                        weights[(polyglotKey(gs), encodeMove(move))] += score
+                    gs.makeMove(move)
+    # weights must fit in 16 bits
+    largest = max(weights.values(), default=0)
+    scale = MAX_WEIGHT / largest if largest > MAX_WEIGHT else 1
+    with open(output_path, 'wb') as book_file:
+        for (key, move) in sorted(weights):
+            book_file.write(ENTRY.pack(key, move, max(1, int(weights[(key, move)] * scale)), 0))
+    return len(weights)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a Polyglot opening book from PGN files")
+    parser.add_argument('pgn', nargs='+')
+    parser.add_argument('--output', '-o', default='book.bin')
+    parser.add_argument('--plies', type=int, default=20, help="number of plies of every game to include")
+    args = parser.parse_args(argv)
+    count = buildBook(args.pgn, args.output, args.plies)
+    print("wrote " + str(count) + " entries to " + args.output)
+
+
+if __name__ == '__main__':
+    main()
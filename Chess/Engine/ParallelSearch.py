@@ -0,0 +1,127 @@
+# Lazy SMP: several engine worker processes search the same position at once, sharing one transposition table in
+# shared memory. They don't divide the work explicitly; each one shuffles the root moves differently, every other
+# helper searches each iteration one ply deeper than the main worker, and what one worker stores in the table cuts
+# the search short for the others. The move played is that of the first worker,
+# and the helpers are stopped as soon as it has finished.
+# Run from the Chess directory to measure the speed-up:
+#   python -m Engine.ParallelSearch [--threads N] [--depth D] [--fen FEN] [--backend NAME] [--hash MB]
+import argparse
+import os
+import sys
+from Engine import Backends
+from Engine import ChessEngine
+from Engine import EngineWorker
+from Engine import TranspositionTable
+
+DEFAULT_THREADS = os.cpu_count() or 1
+HASH_SIZE_MB = 64
+
+
+class ParallelSearcher:
+    def __init__(self, threads=DEFAULT_THREADS, backend=Backends.DEFAULT_BACKEND, hash_size_mb=HASH_SIZE_MB,
+                 book_path=None):
+        self.table = TranspositionTable.createShared(hash_size_mb)
+        shared_hash = (self.table.sharedMemory.name, hash_size_mb)
+        self.workers = [EngineWorker.EngineWorker(backend, shared_hash, book_path) for _ in range(max(1, threads))]
+
+    def newGame(self):
+        """
+        Clears the shared table once, after every worker has stopped searching, and the workers' own history tables.
+        """
+        for worker in self.workers:
+            worker.newGame(clear_hash=False)
+        for worker in self.workers:
+            worker.sync()
+        self.table.clear()
+
+    def search(self, move_ids, fen=None, info_callback=None, **limits):
+        """
+        Searches fen + move_ids with every worker and returns (move_id, info) of the main worker. info also holds
+        'workers', a list with the info of each worker (the main one first) including its nodes per second.
+        limits are findBestMove keyword arguments; info_callback receives the main worker's info after each of its
+        iterations.
+        """
+        self.start(move_ids, fen, info_callback, **limits)
+        return self.finish()
+
+    def start(self, move_ids, fen=None, info_callback=None, **limits):
+        """
+        The first half of search: sets every worker searching and returns at once.
+        """
+        for worker in self.workers:
+            worker.setPosition(move_ids, fen)
+        self.workers[0].go(info_callback, **limits)
+        for number, helper in enumerate(self.workers[1:], 1):
+            helper.go(depth_offset=number % 2, **limits)
+
+    def finish(self):
+        """
+        The second half of search: waits for the main worker, stops the helpers and returns (move_id, info).
+        """
+        move_id, info = self.workers[0].waitForMove()
+        for helper in self.workers[1:]:
+            helper.interrupt()
+        worker_infos = [info] + [helper.waitForMove()[1] for helper in self.workers[1:]]
+        for worker_info in worker_infos:
+            nodes = worker_info['nodes'] + worker_info['qnodes']
+            worker_info['nps'] = nodes / worker_info['time'] if worker_info['time'] > 0 else 0.0
+        info = dict(info)
+        info['workers'] = worker_infos
+        info['nodes'] = sum(worker_info['nodes'] for worker_info in worker_infos)
+        info['qnodes'] = sum(worker_info['qnodes'] for worker_info in worker_infos)
+        info['nps'] = sum(worker_info['nps'] for worker_info in worker_infos)
+        return move_id, info
+
+    def stop(self):
+        """
+        Makes a search running in another thread return the best move found so far.
+        """
+        for worker in self.workers:
+            worker.interrupt()
+
+    def quit(self):
+        for worker in self.workers:
+            worker.quit()
+        self.table.close()
+        self.table.sharedMemory.unlink()
+
+
+def benchmark(fen, depth, thread_counts, backend=Backends.DEFAULT_BACKEND, hash_size_mb=HASH_SIZE_MB,
+              out=sys.stdout):
+    """
+    Searches fen to a fixed depth with each number of threads, starting from an empty table every time, and prints
+    the time to depth, the speed-up over the first thread count and the nodes/second of each worker.
+    Returns a list of (threads, seconds, info).
+    """
+    results = []
+    for threads in thread_counts:
+        searcher = ParallelSearcher(threads, backend, hash_size_mb)
+        try:
+            move_id, info = searcher.search([], fen, max_depth=depth, move_time=None)
+        finally:
+            searcher.quit()
+        results.append((threads, info['time'], info))
+        speedup = results[0][1] / info['time'] if info['time'] > 0 else 0.0
+        out.write("threads %2d  depth %2d  move %-6s  time %7.2fs  speed-up %5.2f  nodes %9d  nps %9.0f\n" %
+                  (threads, info['depth'], info['move'], info['time'], speedup, info['nodes'] + info['qnodes'],
+                   info['nps']))
+        for number, worker_info in enumerate(info['workers']):
+            out.write("    worker %2d  depth %2d  nodes %9d  nps %9.0f\n" %
+                      (number, worker_info['depth'], worker_info['nodes'] + worker_info['qnodes'], worker_info['nps']))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lazy SMP speed-up benchmark")
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help="largest number of worker processes")
+    parser.add_argument('--depth', type=int, default=5)
+    parser.add_argument('--fen', default=ChessEngine.START_FEN)
+    parser.add_argument('--backend', default=Backends.DEFAULT_BACKEND, choices=sorted(Backends.BACKENDS))
+    parser.add_argument('--hash', type=int, default=HASH_SIZE_MB, help="shared table size in MB")
+    args = parser.parse_args(argv)
+    thread_counts = sorted({1, args.threads} | {n for n in (2, 4, 8, 16) if n < args.threads})
+    benchmark(args.fen, args.depth, thread_counts, args.backend, args.hash)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+# Perft (performance test) for the move generator: counts the leaf nodes of the legal move tree to a fixed depth
+# and compares them against published node counts, reporting nodes/second for every position. The suite also
+# searches positions without a legal move, which must come back with no move and an empty principal variation.
+# Run from the Chess directory:  python -m Engine.Perft [--depth N] [--backend NAME] [--fen FEN [--divide]] [--compare]
+import argparse
+import sys
+import time
+from Engine import AI
+from Engine import Backends
+from Engine import ChessEngine
+from Engine import Zobrist
+
+# (name, fen, node counts for depth 1, 2, 3, ...)
+# The engine always promotes to a queen, so only depths without any promotion in the tree are listed.
+PERFT_POSITIONS = [
+    ("startpos", ChessEngine.START_FEN,
+     [20, 400, 8902, 197281]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862]),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624]),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890]),
+]
+# positions without a legal move, which the search must answer with no move and an empty line instead of crashing
+TERMINAL_POSITIONS = [
+    ("checkmate", "7k/6Q1/6K1/8/8/8/8/8 b - - 0 1"),
+    ("stalemate", "7k/5Q2/6K1/8/8/8/8/8 b - - 0 1"),
+]
+
+DEFAULT_DEPTH = 3
+
+
+def perft(gs, depth, verify_hash=False):
+    """
+    Counts the leaf nodes of the legal move tree below the current position.
+    With verify_hash the incremental Zobrist key is checked against a full recompute after every move.
+    """
+    if depth == 0:
+        return 1
+    moves = gs.getValidMoves()
+    if depth == 1 and not verify_hash:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        if verify_hash and gs.zobristKey != Zobrist.computeKey(gs):
+            raise AssertionError("incremental Zobrist key is wrong after " + move.getChessNotation())
+        nodes += perft(gs, depth - 1, verify_hash)
+        gs.undoMove()
+        if verify_hash and gs.zobristKey != Zobrist.computeKey(gs):
+            raise AssertionError("Zobrist key not restored after undoing " + move.getChessNotation())
+    return nodes
+
+
+def perftDivide(gs, depth, verify_hash=False):
+    """
+    Returns a list of (move notation, node count) pairs, one for every legal move at the root.
+    """
+    results = []
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        results.append((move.getChessNotation(), perft(gs, depth - 1, verify_hash)))
+        gs.undoMove()
+    return results
+
+
+def compareBackends(fen, depth, backends=tuple(Backends.BACKENDS)):
+    """
+    Runs perft-divide on the position with every backend and returns a list of
+    (move notation, {backend: node count}) for the root moves on which they disagree.
+    """
+    results = {}
+    for backend in backends:
+        results[backend] = dict(perftDivide(Backends.createGameState(backend, fen), depth))
+    differences = []
+    for notation in sorted(set().union(*results.values())):
+        counts = {backend: results[backend].get(notation) for backend in backends}
+        if len(set(counts.values())) > 1:
+            differences.append((notation, counts))
+    return differences
+
+
+def runSuite(max_depth=DEFAULT_DEPTH, positions=PERFT_POSITIONS, out=sys.stdout, verify_hash=False,
+             backend=Backends.DEFAULT_BACKEND):
+    """
+    Runs perft on every bundled position up to max_depth and prints node counts and nodes/second.
+    Returns the list of mismatches as (name, depth, expected, found) tuples.
+    """
+    failures = []
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, expected_counts in positions:
+        gs = Backends.createGameState(backend, fen)
+        for depth in range(1, min(max_depth, len(expected_counts)) + 1):
+            expected = expected_counts[depth - 1]
+            start = time.perf_counter()
+            nodes = perft(gs, depth, verify_hash)
+            elapsed = time.perf_counter() - start
+            total_nodes += nodes
+            total_time += elapsed
+            status = "ok" if nodes == expected else "FAIL (expected " + str(expected) + ")"
+            print("%-10s depth %d  nodes %10d  time %8.3fs  nps %10.0f  %s"
+                  % (name, depth, nodes, elapsed, nodes / max(elapsed, 1e-9), status), file=out)
+            if nodes != expected:
+                failures.append((name, depth, expected, nodes))
+    print("total nodes %d  time %.3fs  nps %.0f" % (total_nodes, total_time, total_nodes / max(total_time, 1e-9)),
+          file=out)
+    return failures
+
+
+def checkTerminalPositions(positions=TERMINAL_POSITIONS, out=sys.stdout, backend=Backends.DEFAULT_BACKEND):
+    """
+    Searches every position and prints whether it came back with no move and an empty principal variation.
+    Returns the names of the positions that didn't.
+    """
+    failures = []
+    for name, fen in positions:
+        gs = Backends.createGameState(backend, fen)
+        try:
+            move, statistics = AI.search(gs, gs.getValidMoves(), max_depth=2, move_time=None)
+            status = "ok" if move is None and statistics.pv == [] else \
+                "FAIL (move %s, pv %s)" % (move and move.getChessNotation(), statistics.pv)
+        except Exception as error:  # the crash is what this looks for
+            status = "FAIL (%r)" % error
+        print("%-10s search   %s" % (name, status), file=out)
+        if status != "ok":
+            failures.append(name)
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move generator perft benchmark and regression suite")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="maximum depth to search")
+    parser.add_argument("--fen", help="run a single position instead of the bundled suite")
+    parser.add_argument("--divide", action="store_true", help="print node counts per root move (with --fen)")
+    parser.add_argument("--verify-hash", action="store_true",
+                        help="check the incremental Zobrist key against a full recompute after every move (slow)")
+    parser.add_argument("--backend", default=Backends.DEFAULT_BACKEND, choices=sorted(Backends.BACKENDS),
+                        help="move generation backend to run")
+    parser.add_argument("--compare", action="store_true",
+                        help="check that all backends agree move by move (perft-divide) on the positions")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        fens = [args.fen] if args.fen else [fen for _, fen, _ in PERFT_POSITIONS]
+        mismatched = False
+        for fen in fens:
+            for notation, counts in compareBackends(fen, args.depth):
+                mismatched = True
+                print("BACKEND MISMATCH: " + fen + " " + notation + " " + str(counts), file=sys.stderr)
+        print("backends disagree" if mismatched else "backends agree")
+        return 1 if mismatched else 0
+
+    if args.fen:
+        gs = Backends.createGameState(args.backend, args.fen)
+        start = time.perf_counter()
+        if args.divide:
+            results = perftDivide(gs, args.depth, args.verify_hash)
+            for notation, nodes in results:
+                print(notation + ": " + str(nodes))
+            nodes = sum(n for _, n in results)
+        else:
+            nodes = perft(gs, args.depth, args.verify_hash)
+        elapsed = time.perf_counter() - start
+        print("nodes %d  time %.3fs  nps %.0f" % (nodes, elapsed, nodes / max(elapsed, 1e-9)))
+        return 0
+
+    failures = runSuite(args.depth, verify_hash=args.verify_hash, backend=args.backend)
+    search_failures = checkTerminalPositions(backend=args.backend)
+    for name, depth, expected, found in failures:
+        print("PERFT MISMATCH: %s depth %d expected %d found %d" % (name, depth, expected, found), file=sys.stderr)
+    for name in search_failures:
+        print("SEARCH FAILURE: " + name, file=sys.stderr)
+    return 1 if failures or search_failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+# Reading and writing games in PGN and converting between moves and standard algebraic notation (SAN).
+import re
+from Engine.Mailbox import TYPE_MASK, PAWN, ROW_COL
+
+PIECE_LETTERS = {'N': 2, 'B': 3, 'R': 4, 'Q': 5, 'K': 6}  # SAN letter -> piece type
+TYPE_LETTERS = {piece_type: letter for letter, piece_type in PIECE_LETTERS.items()}
+FILES = 'abcdefgh'
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+_TAG = re.compile(r'\[(\w+)\s+"(.*)"\]')
+_SAN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+
+
+def squareName(s):
+    row, col = ROW_COL[s]
+    return FILES[col] + str(8 - row)
+
+
+def sanToMove(gs, san, valid_moves=None):
+    """
+    Returns the legal move of gs written as san, or None if there is none. The engine only promotes to a queen, so
+    under-promotions are never found.
+    """
+    if valid_moves is None:
+        valid_moves = gs.getValidMoves()
+    san = san.rstrip('+#!?')
+    if san in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        kingside = len(san) == 3
+        for move in valid_moves:
+            if move.is_castle_move and (move.endSq > move.startSq) == kingside:
+                return move
+        return None
+    match = _SAN.match(san)
+    if match is None:
+        return None
+    letter, from_file, from_rank, to, promotion = match.groups()
+    piece_type = PIECE_LETTERS[letter] if letter else PAWN
+    if promotion is not None and promotion != 'Q':
+        return None
+    for move in valid_moves:
+        if move.moved & TYPE_MASK != piece_type or squareName(move.endSq) != to or move.is_castle_move:
+            continue
+        start = squareName(move.startSq)
+        if (from_file and start[0] != from_file) or (from_rank and start[1] != from_rank):
+            continue
+        return move
+    return None
+
+
+def moveToSan(gs, move, valid_moves=None):
+    """
+    Returns move, which must be legal in gs, in standard algebraic notation including the check or mate sign.
+    """
+    if valid_moves is None:
+        valid_moves = gs.getValidMoves()
+    piece_type = move.moved & TYPE_MASK
+    end = squareName(move.endSq)
+    start = squareName(move.startSq)
+    if move.is_castle_move:
+        san = 'O-O' if move.endSq > move.startSq else 'O-O-O'
+    elif piece_type == PAWN:
+        san = (start[0] + 'x' + end) if move.is_capture else end
+        if move.isPawnPromotion:
+            san += '=' + TYPE_LETTERS[move.promotion]
+    else:
+        san = TYPE_LETTERS[piece_type]
+        rivals = [other for other in valid_moves if other.moved == move.moved and other.endSq == move.endSq and
+                  other.startSq != move.startSq]
+        if rivals:
+            if all(squareName(other.startSq)[0] != start[0] for other in rivals):
+                san += start[0]
+            elif all(squareName(other.startSq)[1] != start[1] for other in rivals):
+                san += start[1]
+            else:
+                san += start
+        if move.is_capture:
+            san += 'x'
+        san += end
+    gs.makeMove(move)
+    if gs.inCheck():
+        san += '#' if len(gs.getValidMoves()) == 0 else '+'
+    gs.undoMove()
+    return san
+
+
+def _movetextTokens(text):
+    """
+    Splits movetext into move and result tokens, dropping comments, variations, NAGs and move numbers.
+    """
+    depth = 0
+    tokens = []
+    for token in re.findall(r'\{[^}]*\}|;[^\n]*|\(|\)|[^\s(){};]+', text):
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif depth == 0 and token[0] not in '{;$':
+            token = re.sub(r'^\d+\.+', '', token)  # "12." or "12...e5"
+            if token:
+                tokens.append(token)
+    return tokens
+
+
+def readGames(lines):
+    """
+    Yields (headers, sans, result) for every game in an iterable of PGN lines, e.g. an open file.
+    """
+    headers = {}
+    movetext = []
+    for line in lines:
+        line = line.strip()
+        tag = _TAG.match(line)
+        if tag:
+            if movetext:
+                yield _finishGame(headers, movetext)
+                headers, movetext = {}, []
+            headers[tag.group(1)] = tag.group(2)
+        elif line and not line.startswith('%'):
+            movetext.append(line)
+            if line.split()[-1] in RESULTS:
+                yield _finishGame(headers, movetext)
+                headers, movetext = {}, []
+    if headers or movetext:
+        yield _finishGame(headers, movetext)
+
+
+def _finishGame(headers, movetext):
+    tokens = _movetextTokens('\n'.join(movetext))
+    result = headers.get('Result', '*')
+    if tokens and tokens[-1] in RESULTS:
+        result = tokens.pop()
+    return headers, tokens, result
+
+
+def writeGame(headers, sans, result, line_length=80):
+    """
+    Returns a game as PGN text: the tag pairs in the order given, then the movetext wrapped at line_length.
+    The moves are numbered from the FEN tag if there is one.
+    """
+    headers = dict(headers)
+    headers['Result'] = result
+    lines = ['[' + name + ' "' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"]'
+             for name, value in headers.items()]
+    fields = headers.get('FEN', '').split()
+    white_to_move = len(fields) < 2 or fields[1] == 'w'
+    move_number = int(fields[5]) if len(fields) > 5 and fields[5].isdigit() else 1
+    tokens = []
+    for ply, san in enumerate(sans):
+        if white_to_move:
+            tokens.append(str(move_number) + '.')
+        elif ply == 0:
+            tokens.append(str(move_number) + '...')
+        tokens.append(san)
+        if not white_to_move:
+            move_number += 1
+        white_to_move = not white_to_move
+    tokens.append(result)
+    movetext = []
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > line_length:
+            movetext.append(line)
+            line = token
+        else:
+            line = line + ' ' + token if line else token
+    movetext.append(line)
+    return '\n'.join(lines) + '\n\n' + '\n'.join(movetext) + '\n\n'
@@ -0,0 +1,165 @@
+# Statistics of one search, returned with the move by AI.search, and a sampling profiler for finding where the time
+# goes. The counters cost next to nothing and are always kept. The profiler is switched on per search: a background
+# thread looks at the searching thread's stack every SAMPLE_INTERVAL seconds. It charges the sample to a phase (move
+# generation, move ordering, make/undo, evaluation, hash table or the search itself) and to the innermost engine
+# function running. The phase times are estimates: the share of samples times the search time.
+import os
+import sys
+import threading
+
+SAMPLE_INTERVAL = 0.001
+TOP_FUNCTIONS = 10
+
+# engine function name -> phase; a sample goes to the innermost engine frame on the stack that has a phase
+PHASES = {
+    'getValidMoves': 'move generation', 'getCaptureMoves': 'move generation', 'hasLegalMove': 'move generation',
+    'getMoveByID': 'move generation', 'generateMoves': 'move generation',
+    'stagedMoves': 'move ordering', 'orderMoves': 'move ordering', 'scoreMove': 'move ordering',
+    'makeMove': 'make/undo', 'undoMove': 'make/undo',
+    'evaluateBoard': 'evaluation', 'scoreBoard': 'evaluation', 'batchLeafScores': 'evaluation',
+    'probe': 'hash table', 'store': 'hash table',
+}
+SEARCH_PHASE = 'search'
+_ENGINE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+class SearchStatistics:
+    def __init__(self):
+        self.depth = 0
+        self.score = 0
+        self.nodes = 0  # main search nodes
+        self.qnodes = 0  # quiescence search nodes
+        self.betaCutoffs = 0  # main search nodes that failed high
+        self.firstMoveCutoffs = 0  # of those, the ones where the first move searched was enough
+        self.nullMoveCutoffs = 0
+        self.lateMoveReductions = 0  # reduced searches of late quiet moves
+        self.lateMoveResearches = 0  # of those, the ones searched again at full depth
+        self.pvResearches = 0  # null-window searches searched again with the full window
+        self.aspirationResearches = 0  # root searches repeated after falling outside the aspiration window
+        self.pv = []  # principal variation, UCI move strings
+        self.ttProbes = 0
+        self.ttHits = 0
+        self.legalGenerations = 0
+        self.time = 0.0  # seconds
+        self.samples = 0  # profiler samples, 0 when the search wasn't profiled
+        self.phaseTimes = {}  # phase -> estimated seconds, from the profiler
+        self.functionSamples = {}  # 'Module.function' -> samples in which it was the innermost engine function
+
+    @property
+    def nps(self):
+        return (self.nodes + self.qnodes) / self.time if self.time > 0 else 0.0
+
+    @property
+    def firstMoveCutoffRate(self):
+        """
+        The share of cutoffs made by the first move, a measure of move ordering: 1.0 is perfect.
+        """
+        return self.firstMoveCutoffs / self.betaCutoffs if self.betaCutoffs else 0.0
+
+    @property
+    def ttHitRate(self):
+        return self.ttHits / self.ttProbes if self.ttProbes else 0.0
+
+    def asDict(self):
+        return {'depth': self.depth, 'score': self.score, 'nodes': self.nodes, 'qnodes': self.qnodes,
+                'beta_cutoffs': self.betaCutoffs, 'first_move_cutoffs': self.firstMoveCutoffs,
+                'first_move_cutoff_rate': self.firstMoveCutoffRate, 'null_move_cutoffs': self.nullMoveCutoffs,
+                'late_move_reductions': self.lateMoveReductions, 'late_move_researches': self.lateMoveResearches,
+                'pv_researches': self.pvResearches, 'aspiration_researches': self.aspirationResearches,
+                'pv': list(self.pv), 'tt_probes': self.ttProbes, 'tt_hits': self.ttHits, 'tt_hit_rate': self.ttHitRate,
+                'legal_generations': self.legalGenerations,
+                'time': self.time, 'nps': self.nps, 'samples': self.samples, 'phase_times': dict(self.phaseTimes),
+                'function_samples': dict(self.functionSamples)}
+
+    def __str__(self):
+        lines = ["depth %d  score %.2f  nodes %d + %d quiescence  %.3fs  %.0f nodes/s" %
+                 (self.depth, self.score, self.nodes, self.qnodes, self.time, self.nps),
+                 "cutoffs %d (%.1f%% by the first move)  hash hits %d/%d (%.1f%%)  legal generations %d" %
+                 (self.betaCutoffs, 100 * self.firstMoveCutoffRate, self.ttHits, self.ttProbes,
+                  100 * self.ttHitRate, self.legalGenerations),
+                 "null-move cutoffs %d  late move reductions %d (%d searched again)" %
+                 (self.nullMoveCutoffs, self.lateMoveReductions, self.lateMoveResearches),
+                 "null-window searches searched again %d  aspiration windows widened %d" %
+                 (self.pvResearches, self.aspirationResearches),
+                 "pv " + " ".join(self.pv)]
+        if self.samples:
+            lines.append("time by phase (%d samples): " % self.samples + ", ".join(
+                "%s %.3fs" % (phase, seconds)
+                for phase, seconds in sorted(self.phaseTimes.items(), key=lambda item: -item[1])))
+            top = sorted(self.functionSamples.items(), key=lambda item: -item[1])[:TOP_FUNCTIONS]
+            lines.append("hot functions: " + ", ".join("%s %.1f%%" % (name, 100 * count / self.samples)
+                                                       for name, count in top))
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of the thread that creates it, from start() until stop(), into phase and function counts.
+    """
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.targetID = threading.get_ident()
+        self.phaseSamples = {}
+        self.functionSamples = {}
+        self.samples = 0
+        self.functionNames = {}  # code object -> functionName, computed once per function
+        self.stopEvent = threading.Event()
+        self.thread = None
+        self.switchInterval = None
+
+    def start(self):
+        # the sampler can only run when the searching thread lets go of the GIL, which it does every switch interval
+        self.switchInterval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self.switchInterval, self.interval))
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopEvent.set()
+        self.thread.join()
+        sys.setswitchinterval(self.switchInterval)
+
+    def run(self):
+        while not self.stopEvent.wait(self.interval):
+            frame = sys._current_frames().get(self.targetID)
+            if frame is not None:
+                self.sample(frame)
+
+    def functionName(self, code):
+        """
+        'Module.function' for code of the engine package, None for other code.
+        """
+        if code not in self.functionNames:
+            if os.path.dirname(os.path.abspath(code.co_filename)) == _ENGINE_DIRECTORY:
+                self.functionNames[code] = os.path.splitext(os.path.basename(code.co_filename))[0] + '.' + \
+                    code.co_name
+            else:
+                self.functionNames[code] = None
+        return self.functionNames[code]
+
+    def sample(self, frame):
+        phase = None
+        function = None
+        while frame is not None and phase is None:
+            code = frame.f_code
+            name = self.functionName(code)
+            if name is not None:  # another module's store or probe isn't the hash table
+                if function is None:
+                    function = name
+                phase = PHASES.get(code.co_name)
+            frame = frame.f_back
+        phase = phase or SEARCH_PHASE
+        self.samples += 1
+        self.phaseSamples[phase] = self.phaseSamples.get(phase, 0) + 1
+        if function is not None:
+            self.functionSamples[function] = self.functionSamples.get(function, 0) + 1
+
+    def fill(self, statistics):
+        """
+        Copies the samples into statistics, turning phase samples into estimated seconds of statistics.time.
+        """
+        statistics.samples = self.samples
+        statistics.functionSamples = dict(self.functionSamples)
+        if self.samples:
+            statistics.phaseTimes = {phase: statistics.time * count / self.samples
+                                     for phase, count in self.phaseSamples.items()}
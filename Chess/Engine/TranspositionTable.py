@@ -0,0 +1,143 @@
+# Fixed size transposition table keyed by GameState.zobristKey.
+# Every bucket holds two entries: the first is only replaced by a search of at least the same depth, the second is
+# always replaced, so deep results survive while recent shallow ones are still available.
+# The arrays can live in a multiprocessing shared memory block (createShared / attachShared), letting several search
+# processes share one table. Writes are not locked, so an entry stores its key XORed with its packed data: an entry
+# mixed from two racing writes no longer gives back the key it is probed with and is treated as empty.
+from multiprocessing import shared_memory
+import numpy as np
+
+EXACT = 0
+LOWERBOUND = 1  # score is at least the stored value (the search failed high)
+UPPERBOUND = 2  # score is at most the stored value (the search failed low)
+
+NO_MOVE = -1
+
+# key, score, move id, depth and flag
+ENTRY_SIZE = np.dtype(np.uint64).itemsize + np.dtype(np.float64).itemsize + np.dtype(np.int32).itemsize + \
+             np.dtype(np.int8).itemsize + np.dtype(np.int8).itemsize
+
+
+def packData(score, depth, flag, move_id):
+    """
+    Folds an entry's fields into 64 bits, the value its stored key is XORed with.
+    """
+    return int(np.float64(score).view(np.uint64)) ^ ((move_id & 0xFFFFFFFF) << 16 | (depth & 0xFF) << 8 | flag)
+
+
+def bucketCount(size_mb):
+    return max(1, int(size_mb * 1024 * 1024) // (2 * ENTRY_SIZE))
+
+
+def createShared(size_mb=16):
+    """
+    Creates an empty table in a new shared memory block. Other processes attach to it with
+    attachShared(table.sharedMemory.name, size_mb); the creator calls unlink once they are done.
+    """
+    block = shared_memory.SharedMemory(create=True, size=2 * bucketCount(size_mb) * ENTRY_SIZE)
+    table = TranspositionTable(size_mb, block)
+    table.clear()
+    return table
+
+
+def attachShared(name, size_mb=16):
+    return TranspositionTable(size_mb, shared_memory.SharedMemory(name=name))
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=16, shared_block=None):
+        self.bucketCount = bucketCount(size_mb)
+        entries = 2 * self.bucketCount
+        self.sharedMemory = shared_block
+        if shared_block is None:
+            self.keys = np.zeros(entries, dtype=np.uint64)
+            self.scores = np.zeros(entries, dtype=np.float64)
+            self.moves = np.full(entries, NO_MOVE, dtype=np.int32)
+            self.depths = np.full(entries, -1, dtype=np.int8)  # -1 marks an empty entry
+            self.flags = np.zeros(entries, dtype=np.int8)
+        else:
+            # views into the block, widest type first so every array stays aligned
+            offset = 0
+            arrays = []
+            for dtype in (np.uint64, np.float64, np.int32, np.int8, np.int8):
+                arrays.append(np.ndarray(entries, dtype=dtype, buffer=shared_block.buf, offset=offset))
+                offset += entries * np.dtype(dtype).itemsize
+            self.keys, self.scores, self.moves, self.depths, self.flags = arrays
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0  # probes that found the bucket occupied by other positions
+        self.stores = 0
+
+    def clear(self):
+        self.keys.fill(0)
+        self.scores.fill(0)
+        self.flags.fill(0)
+        self.moves.fill(NO_MOVE)
+        self.depths.fill(-1)
+        self.resetStats()
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def probe(self, key):
+        """
+        Returns (depth, flag, score, move id) stored for the position, or None.
+        """
+        index = 2 * (key % self.bucketCount)
+        for i in (index, index + 1):
+            entry = self.readEntry(i)
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return entry[1:]
+        self.misses += 1
+        if self.depths[index] >= 0 or self.depths[index + 1] >= 0:
+            self.collisions += 1
+        return None
+
+    def readEntry(self, i):
+        """
+        Returns (key, depth, flag, score, move id) of entry i, or None if it is empty. Every field is read once, so the
+        key only comes out right if they all belong to the same write.
+        """
+        depth = int(self.depths[i])
+        if depth < 0:
+            return None
+        flag = int(self.flags[i])
+        score = self.scores[i]
+        move_id = int(self.moves[i])
+        return int(self.keys[i]) ^ packData(score, depth, flag, move_id), depth, flag, float(score), move_id
+
+    def store(self, key, depth, flag, score, move_id=NO_MOVE):
+        index = 2 * (key % self.bucketCount)
+        # the depth-preferred entry takes the result if it is the same position or a search at least as deep
+        entry = self.readEntry(index)
+        if entry is None or entry[0] == key or depth >= entry[1]:
+            i = index
+        else:
+            i = index + 1
+            entry = self.readEntry(i)
+        if move_id == NO_MOVE and entry is not None and entry[0] == key:
+            move_id = entry[4]  # keep the best move found by an earlier search of this position
+        self.depths[i] = depth
+        self.flags[i] = flag
+        self.scores[i] = score
+        self.moves[i] = move_id
+        self.keys[i] = key ^ packData(score, depth, flag, move_id)
+        self.stores += 1
+
+    def close(self):
+        """
+        Detaches a shared table from its memory block; the table can't be used afterwards.
+        """
+        if self.sharedMemory is not None:
+            self.keys = self.scores = self.moves = self.depths = self.flags = None
+            self.sharedMemory.close()
+
+    def hashfull(self):
+        """
+        Returns the used fraction of the table in permille.
+        """
+        return int(np.count_nonzero(self.depths >= 0) * 1000 // len(self.depths))
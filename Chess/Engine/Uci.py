@@ -0,0 +1,259 @@
+# UCI (Universal Chess Interface) front end, so that chess GUIs and match managers such as cutechess-cli can run the
+# engine headless. Commands are read from stdin and answered on stdout; pygame is never imported.
+# Run from the Chess directory:
+#   python -m Engine.Uci [--backend NAME]
+# Searches run in ParallelSearch worker processes, one per Threads, while this process goes on reading commands,
+# so stop and isready are answered in the middle of a search.
+# Supported: uci, isready, ucinewgame, setoption (Hash, Threads, BookFile), position startpos/fen ... moves ...,
+# go depth/nodes/movetime/wtime/btime/winc/binc/infinite, stop and quit.
+import argparse
+import sys
+import threading
+from Engine import AI
+from Engine import Backends
+from Engine import ParallelSearch
+
+ENGINE_NAME = "Chess-engine"
+MAX_HASH_MB = 1024
+MAX_THREADS = 64
+
+
+def moveFromUci(gs, text, valid_moves=None):
+    """
+    Returns the legal move of gs written in UCI notation (e2e4, e7e8q), or None.
+    """
+    if valid_moves is None:
+        valid_moves = gs.getValidMoves()
+    for move in valid_moves:
+        if move.getUciNotation() == text:
+            return move
+    return None
+
+
+def parseGo(tokens, white_to_move):
+    """
+    Returns (findBestMove limits, infinite) for the arguments of a go command.
+    """
+    values = {}
+    infinite = False
+    i = 0
+    while i < len(tokens):
+        if tokens[i] == 'infinite':
+            infinite = True
+        elif i + 1 < len(tokens):
+            try:
+                values[tokens[i]] = int(tokens[i + 1])
+                i += 1
+            except ValueError:
+                pass
+        i += 1
+    limits = {'max_depth': values.get('depth', AI.MAX_DEPTH), 'move_time': None}
+    if 'nodes' in values:
+        limits['max_nodes'] = values['nodes']
+    time_left = values.get('wtime' if white_to_move else 'btime')
+    if 'movetime' in values:
+        limits['move_time'] = values['movetime'] / 1000
+    elif time_left is not None:
+        limits['time_left'] = time_left / 1000
+        limits['increment'] = values.get('winc' if white_to_move else 'binc', 0) / 1000
+    elif 'depth' not in values and 'nodes' not in values:
+        infinite = True  # a bare go searches until stop
+    return limits, infinite
+
+
+def infoLine(info):
+    """
+    The UCI info line for a searchInfo dict. Scores are converted from pawns to centipawns, or to moves to mate.
+    """
+    nodes = info['nodes'] + info['qnodes']
+    mate = AI.mateDistance(info['score'])
+    if mate is not None:
+        score = "mate " + str(mate)
+    else:
+        score = "cp " + str(int(round(info['score'] * 100)))
+    line = "info depth %d score %s nodes %d nps %d time %d hashfull %d" % (
+        info['depth'], score, nodes, nodes / info['time'] if info['time'] > 0 else 0, info['time'] * 1000,
+        info['hashfull'])
+    if info['pv']:
+        line += " pv " + " ".join(info['pv'])
+    return line
+
+
+class UciEngine:
+    def __init__(self, backend=Backends.DEFAULT_BACKEND, out=sys.stdout):
+        self.backend = backend
+        self.out = out
+        self.outputLock = threading.Lock()  # info lines come from the search thread
+        self.hashSize = ParallelSearch.HASH_SIZE_MB
+        self.threads = 1
+        self.bookPath = None
+        self.searcher = None  # created on first use, and again after an option change
+        self.searchThread = None
+        self.searchInfinite = False  # the running search only ends on stop
+        self.stopRequested = threading.Event()
+        self.fen = None
+        self.moveIDs = []
+        self.gs = Backends.createGameState(backend)
+
+    def send(self, line):
+        with self.outputLock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def handle(self, line):
+        """
+        Carries out one command line. Returns False once the engine should exit.
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, arguments = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author the " + ENGINE_NAME + " authors")
+            self.send("option name Hash type spin default %d min 1 max %d" % (ParallelSearch.HASH_SIZE_MB,
+                                                                              MAX_HASH_MB))
+            self.send("option name Threads type spin default 1 min 1 max %d" % MAX_THREADS)
+            self.send("option name BookFile type string default <empty>")
+            self.send("uciok")
+        elif command == 'isready':
+            self.getSearcher()
+            self.send("readyok")
+        elif command == 'ucinewgame':
+            self.waitForSearch()
+            if self.searcher is not None:
+                self.searcher.newGame()
+        elif command == 'setoption':
+            self.setOption(arguments)
+        elif command == 'position':
+            self.waitForSearch()
+            self.setPosition(arguments)
+        elif command == 'go':
+            self.waitForSearch()
+            self.go(arguments)
+        elif command == 'stop':
+            self.stop()
+        elif command == 'quit':
+            self.quit()
+            return False
+        return True
+
+    def setOption(self, arguments):
+        if 'name' not in arguments:
+            return
+        value_index = arguments.index('value') if 'value' in arguments else len(arguments)
+        name = " ".join(arguments[arguments.index('name') + 1:value_index]).lower()
+        value = " ".join(arguments[value_index + 1:])
+        self.waitForSearch()
+        try:
+            if name == 'hash':
+                self.hashSize = max(1, min(MAX_HASH_MB, int(value)))
+            elif name == 'threads':
+                self.threads = max(1, min(MAX_THREADS, int(value)))
+            elif name == 'bookfile':
+                self.bookPath = value if value and value != '<empty>' else None
+            else:
+                self.send("info string unknown option " + name)
+                return
+        except ValueError:
+            self.send("info string bad value for " + name + ": " + value)
+            return
+        if self.searcher is not None:
+            self.searcher.quit()
+            self.searcher = None
+
+    def getSearcher(self):
+        if self.searcher is None:
+            self.searcher = ParallelSearch.ParallelSearcher(self.threads, self.backend, self.hashSize, self.bookPath)
+        return self.searcher
+
+    def setPosition(self, arguments):
+        moves_index = arguments.index('moves') if 'moves' in arguments else len(arguments)
+        if arguments and arguments[0] == 'fen':
+            fen = " ".join(arguments[1:moves_index])
+        else:
+            fen = None
+        try:
+            gs = Backends.createGameState(self.backend, fen)
+        except (ValueError, KeyError, IndexError):
+            self.send("info string bad fen " + str(fen))
+            return
+        move_ids = []
+        for text in arguments[moves_index + 1:]:
+            move = moveFromUci(gs, text)
+            if move is None:
+                self.send("info string illegal move " + text)
+                break
+            gs.makeMove(move)
+            move_ids.append(move.moveID)
+        self.fen, self.moveIDs, self.gs = fen, move_ids, gs
+
+    def go(self, arguments):
+        limits, infinite = parseGo(arguments, self.gs.whiteToMove)
+        names = {move.moveID: move.getUciNotation() for move in self.gs.getValidMoves()}
+        searcher = self.getSearcher()
+        self.stopRequested.clear()
+        if names:
+            # started here rather than in the search thread, so that a stop right after go can't overtake it
+            searcher.start(self.moveIDs, self.fen, self.sendInfo, **limits)
+        self.searchInfinite = infinite
+        self.searchThread = threading.Thread(target=self.search, args=(searcher, names, infinite), daemon=True)
+        self.searchThread.start()
+
+    def search(self, searcher, names, infinite):
+        """
+        Runs in the search thread: waits for the search, streaming an info line per iteration, then sends bestmove.
+        """
+        if names:
+            move_id, info = searcher.finish()
+            if 'error' in info:
+                self.send("info string " + info['error'])
+            elif info['book']:
+                self.send("info string book move")
+        else:
+            move_id = None  # checkmate or stalemate
+        if infinite:
+            self.stopRequested.wait()  # bestmove may only be sent after stop
+        self.send("bestmove " + names.get(move_id, "0000"))
+
+    def sendInfo(self, info):
+        self.send(infoLine(info))
+
+    def stop(self):
+        self.stopRequested.set()
+        if self.searchThread is not None and self.searcher is not None:
+            self.searcher.stop()
+
+    def waitForSearch(self):
+        """
+        Lets a running search finish; commands that change the position or the options wait for it. An infinite
+        search would never finish while this thread, the only one reading commands, waits, so it is stopped first
+        as if a stop had come in.
+        """
+        if self.searchThread is not None:
+            if self.searchInfinite:
+                self.stop()
+            self.searchThread.join()
+            self.searchThread = None
+
+    def quit(self):
+        self.stop()
+        self.waitForSearch()
+        if self.searcher is not None:
+            self.searcher.quit()
+            self.searcher = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="UCI chess engine")
+    parser.add_argument('--backend', default=Backends.DEFAULT_BACKEND, choices=sorted(Backends.BACKENDS))
+    args = parser.parse_args(argv)
+    engine = UciEngine(args.backend)
+    for line in sys.stdin:
+        if not engine.handle(line):
+            return
+    engine.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# Zobrist hashing: every (piece, square) pair, the side to move, each castling right and each en passant file gets a
+# random 64 bit number, and a position's key is the xor of the numbers of everything present in it.
+# As in Polyglot, the en passant file only counts when a pawn stands next to the pawn that just moved two squares,
+# so that positions that differ only in an en passant capture nobody can make share a key and repeat.
+# GameState keeps its key up to date incrementally in makeMove/undoMove; computeKey rebuilds it from scratch.
+import random
+from Engine import Mailbox
+
+_rng = random.Random(0x5EED)  # fixed seed so keys are identical in every process
+
+# PIECE_KEYS[piece code][mailbox square]
+PIECE_KEYS = [[0] * 120 for _ in range(len(Mailbox.PIECE_NAMES))]
+for _color in (Mailbox.WHITE, Mailbox.BLACK):
+    for _type in (Mailbox.PAWN, Mailbox.KNIGHT, Mailbox.BISHOP, Mailbox.ROOK, Mailbox.QUEEN, Mailbox.KING):
+        for _s in Mailbox.SQUARES:
+            PIECE_KEYS[_color | _type][_s] = _rng.getrandbits(64)
+SIDE_KEY = _rng.getrandbits(64)  # xored in when black is to move
+CASTLE_KEYS = {right: _rng.getrandbits(64) for right in ('wks', 'bks', 'wqs', 'bqs')}
+ENPASSANT_KEYS = [0] + [_rng.getrandbits(64) for _ in range(8)] + [0]  # indexed by square % 10, i.e. file + 1
+
+
+def castlingKey(rights):
+    key = 0
+    if rights.wks:
+        key ^= CASTLE_KEYS['wks']
+    if rights.bks:
+        key ^= CASTLE_KEYS['bks']
+    if rights.wqs:
+        key ^= CASTLE_KEYS['wqs']
+    if rights.bqs:
+        key ^= CASTLE_KEYS['bqs']
+    return key
+
+
+def enpassantKey(enpassant_square, squares):
+    if not enpassant_square:
+        return 0
+    if enpassant_square // 10 == 4:  # on the 6th rank, white takes from the square beside the one below it
+        pawn_square, pawn = enpassant_square + 10, Mailbox.WHITE | Mailbox.PAWN
+    else:
+        pawn_square, pawn = enpassant_square - 10, Mailbox.BLACK | Mailbox.PAWN
+    if squares[pawn_square - 1] == pawn or squares[pawn_square + 1] == pawn:
+        return ENPASSANT_KEYS[enpassant_square % 10]
+    return 0
+
+
+def computeKey(gs):
+    """
+    Computes the key of the position from scratch. Used to initialise and to verify the incremental key.
+    """
+    key = 0
+    for s in Mailbox.SQUARES:
+        piece = gs.squares[s]
+        if piece != Mailbox.EMPTY:
+            key ^= PIECE_KEYS[piece][s]
+    if not gs.whiteToMove:
+        key ^= SIDE_KEY
+    key ^= castlingKey(gs.currentCastlingRights)
+    key ^= enpassantKey(gs.enpassantPossible, gs.squares)
+    return key
@@ -1,9 +1,9 @@
 # driver file that handles user input and displays the GameState object
 import pygame as p
-from Engine import ChessEngine
+from Engine import Backends
 from Engine import AI
 from Engine import ChessMove
-from multiprocessing import Process, Queue
+from Engine import EngineWorker
 
 WIDTH = HEIGHT = 512
 MOVE_LOG_PANEL_WIDTH = 250
@@ -11,6 +11,12 @@ MOVE_LOG_PANEL_HEIGHT = 512
 DIMENSION = 8
 SQ_SIZE = HEIGHT // DIMENSION
 MAX_FPS = 15
+BACKEND = Backends.DEFAULT_BACKEND  # move generator used by the game and the AI: 'mailbox' or 'bitboard'
+PRINT_SEARCH_STATISTICS = False  # print the statistics of every AI search to the console
+PROFILE_SEARCH = False  # sample the AI's searches to show the time spent in move generation, evaluation etc.,
+# printed with the statistics even when PRINT_SEARCH_STATISTICS is off
+PONDER = True  # while the human thinks, search the reply the AI expects, and answer sooner when it is played
+BOOK_PATH = None  # Polyglot opening book for the AI, e.g. "book.bin" built with python -m Engine.OpeningBook
 IMAGES = {}
 
 
@@ -26,7 +32,7 @@ def main():
     screen = p.display.set_mode((WIDTH+MOVE_LOG_PANEL_WIDTH, HEIGHT))
     clock = p.time.Clock()
     screen.fill(p.Color("white"))
-    gs = ChessEngine.GameState()
+    gs = Backends.createGameState(BACKEND)
     valid_moves = gs.getValidMoves()
     move_made = False
     animate = False  # flag variable for when we should animate a move
@@ -39,13 +45,17 @@ def main():
     playerOne = True  # True if a human is playing white
     playerTwo = False  # True if a human is playing black
     AIThinking = False
-    move_finder_process = None
+    ponderMove = None  # the human reply the AI is pondering on, None when not pondering
+    # searches in its own process, keeping its tables between moves
+    engine = EngineWorker.EngineWorker(BACKEND, book_path=BOOK_PATH)
     move_undone = False
     while running:
         humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
         for e in p.event.get():
             if e.type == p.QUIT:
                 running = False
+                engine.quit()
+                break  # the rest of the events and of the frame would use the engine that just quit
             # mouse handler
             elif e.type == p.MOUSEBUTTONDOWN:
                 if not gameOver and humanTurn:
@@ -77,37 +87,54 @@ def main():
                     move_made = True
                     animate = False
                     gameOver = False
-                    if AIThinking:
-                        move_finder_process.terminate()
+                    if AIThinking or ponderMove is not None:
+                        engine.stop()
                         AIThinking = False
+                        ponderMove = None
                     move_undone = True
                 if e.key == p.K_r:  # reset when r is pressed
-                    gs = ChessEngine.GameState()
+                    gs = Backends.createGameState(BACKEND)
                     valid_moves = gs.getValidMoves()
                     current_sq = ()
                     player_clicks = []
                     move_made = False
                     animate = False
                     gameOver = False
-                    if AIThinking:
-                        move_finder_process.terminate()
-                        AIThinking = False
+                    engine.newGame()
+                    AIThinking = False
+                    ponderMove = None
                     move_undone = True
+        if not running:
+            break
         #AI move finder
         if not gameOver and not humanTurn and not move_undone:
             if not AIThinking:
                 AIThinking = True
-                returnQueue = Queue()  #used to pass data between threads
-                move_finder_process = Process(target=AI.findBestMove, args=(gs, valid_moves, returnQueue))
-                move_finder_process.start()
-            if not move_finder_process.is_alive():
-                AIMove = returnQueue.get()
+                if ponderMove is not None and gs.moveLog and gs.moveLog[-1].moveID == ponderMove.moveID:
+                    engine.ponderHit()  # the search of this position is under way already
+                else:
+                    engine.stop()  # a ponder miss, if pondering
+                    engine.setPosition([move.moveID for move in gs.moveLog])
+                    engine.go(move_time=AI.MOVE_TIME, profile=PROFILE_SEARCH)
+                ponderMove = None
+            result = engine.poll()
+            if result is not None:
+                if 'error' in result[1]:
+                    print("engine error: " + result[1]['error'])  # a random move is played instead
+                elif PRINT_SEARCH_STATISTICS or PROFILE_SEARCH:  # a profile is only of use printed
+                    print(result[1]['statistics'])
+                # valid_moves is only brought up to date after the human's move at the end of the frame, and a
+                # ponder hit can answer within the same frame
+                legal_moves = gs.getValidMoves()
+                AIMove = next((move for move in legal_moves if move.moveID == result[0]), None)
                 if AIMove is None:
-                    AIMove = AI.findRandomMove()
+                    AIMove = AI.findRandomMove(legal_moves)
                 gs.makeMove(AIMove)
                 move_made = True
                 animate = True
                 AIThinking = False
+                if PONDER and ((gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)):
+                    ponderMove = startPondering(engine, gs, AIMove, result[1]['pv'])
         if move_made:
             if animate:
                 animateMove(gs.moveLog[-1], screen, gs.board, clock)
@@ -122,6 +149,20 @@ def main():
         p.display.flip()
 
 
+def startPondering(engine, gs, ai_move, pv):
+    """
+    Starts a search of the position after the human reply the AI's principal variation expects, and returns that
+    reply, or None when the variation doesn't go that far.
+    """
+    if len(pv) < 2 or pv[0] != ai_move.getUciNotation():
+        return None
+    ponder_move = next((move for move in gs.getValidMoves() if move.getUciNotation() == pv[1]), None)
+    if ponder_move is not None:
+        engine.setPosition([move.moveID for move in gs.moveLog] + [ponder_move.moveID])
+        engine.go(ponder=True, move_time=AI.MOVE_TIME, profile=PROFILE_SEARCH)
+    return ponder_move
+
+
 def drawGameState(screen, gs, valid_moves, current_sq, move_log_font):
     drawBoard(screen)
     highlightSquares(screen, gs, valid_moves, current_sq)